@@ -1,22 +1,36 @@
 # app.py
 
-from flask import Flask, render_template, request, redirect, url_for, session, make_response, flash
+from flask import Flask, render_template, request, redirect, url_for, session, make_response, flash, Response, jsonify, send_from_directory, abort
 import os
-import cv2
 import torch
 import numpy as np
-import urllib.request
 import threading
 import time
 import json
+import hashlib
 import pathlib
-import traceback
 import logging
 import sys  # Importação adicionada
 
 from config import Config
 from app_utils import allowed_file, secure_filename_custom, TryExcept  # Importação atualizada
-from model_cache import ModelCache  # Importação atualizada
+from model_cache import ModelCache, ModelLoader  # Importação atualizada
+from frame_grabber import FrameGrabber
+from camera_source import CAMERA_MODES
+from inference_scheduler import InferenceScheduler
+from ranking_store import open_ranking_store, best_detection
+from frame_publisher import FramePublisher
+from capture_writer import CaptureWriter
+from thumbnails import ensure_thumbnail, delete_thumbnail
+from inference_profile import InferenceProfile
+from motion_gate import MotionGate
+from rate_controller import RateController
+from preprocessing import full_resolution_image, draw_detections
+from metrics import registry, TimedLock
+from sampling_profiler import SamplingProfiler
+from log_setup import setup_logging
+from group_worker import ProcessLauncher, WorkerGroupProcessor, control_authkey, worker_running
+from worker_pool import PoolFullError, WorkerPool
 
 # Configurações de caminho para sistemas Windows
 pathlib.PosixPath = pathlib.WindowsPath
@@ -24,23 +38,59 @@ pathlib.PosixPath = pathlib.WindowsPath
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Configuração de Logging
-logging.basicConfig(
-    filename=app.config['LOG_FILE'],
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
-
 # Variáveis globais
 groups = {}
-ranking_data = []
-ranking_data_lock = threading.RLock()
+ranking_data_lock = TimedLock(threading.RLock(), 'ranking_data_lock')  # Tempo de espera exportado em /metrics
 group_processors = {}
-group_processors_lock = threading.Lock()
+group_processors_lock = TimedLock(threading.Lock(), 'group_processors_lock')
+active_requests = {}  # Ident da thread -> rota em atendimento (usado pelo profiler em /admin/profile)
 
 # Carregar configurações iniciais
 settings = Config.load_settings()
+
+# Configuração de Logging: gravação em segundo plano, rotação por tamanho e erros repetidos deduplicados
+setup_logging(
+    app.config['LOG_FILE'],
+    max_bytes=settings.get('log_max_mb', 10) * 1024 * 1024,
+    backup_count=settings.get('log_backup_count', 5),
+    dedup_interval=settings.get('log_dedup_interval', 60)
+)
 app.config['CAMERA_URL'] = settings.get('camera_url', 'http://192.168.1.7/cam-hi.jpg')
+app.config['CAMERA_MODE'] = settings.get('camera_mode', 'snapshot')
+# Padrões para grupos sem 'camera_url'/'camera_mode'/'camera_timeout' próprios em groups.json
+app.config['CAMERA_TIMEOUT'] = settings.get('camera_timeout', 5)
+app.config['LIVE_STREAM_MAX_FPS'] = settings.get('live_stream_max_fps', 10)
+app.config['GALLERY_PAGE_SIZE'] = settings.get('gallery_page_size', 24)
+# 'thread': processadores no próprio processo; 'process': um processo worker por grupo (group_worker.py);
+# 'pool': workers fixos presos aos núcleos físicos, com vários grupos cada (worker_pool.py)
+app.config['PROCESSING_MODE'] = settings.get('processing_mode', 'thread')
+
+# Ranking persistido em SQLite; importa o ranking.json legado na primeira execução
+ranking_store = open_ranking_store(app.config['RANKING_DB'], 'ranking.json', lock=ranking_data_lock)
+
+# Escalonador central de inferência compartilhado por todos os grupos
+inference_scheduler = InferenceScheduler(
+    num_workers=settings.get('inference_workers', 1),
+    queue_size=settings.get('inference_queue_size', 1)
+)
+
+# Perfil de inferência em CPU (modo, tamanho de entrada e threads) e orçamento do cache de modelos
+inference_profile = InferenceProfile.from_settings(settings)
+ModelCache.configure(max_bytes=settings.get('model_cache_max_mb', 1024) * 1024 * 1024, profile=inference_profile)
+# Decodifica os quadros da câmera já reduzidos para perto do tamanho de entrada do modelo;
+# as câmeras são lidas no mesmo event loop ('async') ou com uma thread cada ('thread')
+FrameGrabber.configure(
+    decode_size=inference_profile.input_size if settings.get('reduced_decode', True) else None,
+    fetcher=settings.get('camera_fetcher', 'async'),
+    max_backoff=settings.get('camera_max_backoff', 30),
+    decode_threads=settings.get('camera_decode_threads', 2)
+)
+
+# Gravação das capturas em segundo plano
+capture_writer = CaptureWriter(
+    queue_size=settings.get('capture_queue_size', 64),
+    jpeg_quality=settings.get('capture_jpeg_quality', 95)
+)
 
 # Adiciona o diretório yolov5 ao PYTHONPATH antes do diretório atual
 yolov5_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5')
@@ -67,40 +117,85 @@ class GroupProcessor:
         self.model_loaded = False
         self.processing_active = False
         self.capturing = False
-        self.frame = None
+        self.frame = None  # Último quadro anotado; desenhado sob demanda (annotated_frame)
+        self.results_seq = 0  # Incrementa a cada novo resultado de inferência
+        self.rendered_seq = 0
+        self.render_lock = threading.RLock()
+        self.publisher = FramePublisher()  # Último quadro já codificado em JPEG para os clientes
+        self.motion_gate = MotionGate(
+            threshold=settings.get('motion_threshold', 2.0),
+            max_skip_seconds=settings.get('motion_max_skip_seconds', 5.0)
+        )
+        self.last_results = None
+        self.results_image = None  # Quadro em que o último resultado foi calculado (somente leitura)
+        self.last_grabbed = None  # Quadro ao qual o último resultado se aplica (para capturas manuais)
+        self.rate_controller = RateController(
+            target_fps=settings.get('live_target_fps', 10),
+            min_fps=settings.get('live_min_fps', 1),
+            idle_fps=settings.get('live_idle_fps', 2),
+            latency_budget=settings.get('live_latency_budget', 0.5),
+            cpu_budget=settings.get('live_cpu_budget', 0.8)
+        )
         self.capture_thread = None
+        self.grabber = None  # Grabber da câmera em uso pelo processamento ao vivo
         self.last_capture_time = time.time()
-        self.camera_url = app.config['CAMERA_URL']
+        self.camera_url, self.camera_mode, self.camera_timeout = group_camera(group_name)
         self.group_capture_dir = os.path.join('static', 'captures', self.group_name)
         os.makedirs(self.group_capture_dir, exist_ok=True)
+        inference_scheduler.start()
+        capture_writer.start()
+        self.pinned_model = None
         self.load_model()
 
     def load_model(self):
+        """Dispara o carregamento do modelo em segundo plano e retorna o Future (ou None se não houver modelo)."""
         global groups
         model_path = groups.get(self.group_name, {}).get('model')
         if model_path and os.path.exists(model_path):
             logging.info(f"Tentando carregar o modelo para o grupo '{self.group_name}' a partir de '{model_path}'")
-            try:
-                self.model = ModelCache.get_model(model_path)
-                if self.model:
-                    self.model_loaded = True
-                    logging.info(f"Modelo carregado com sucesso para o grupo '{self.group_name}'")
-                else:
-                    self.model_loaded = False
-                    logging.error(f"Falha ao carregar o modelo para o grupo '{self.group_name}' a partir de '{model_path}'")
-            except Exception as e:
-                self.model_loaded = False
-                logging.error(f"Erro ao carregar o modelo para o grupo '{self.group_name}': {e}")
-        else:
-            logging.error(f"Modelo para o grupo '{self.group_name}' não encontrado em '{model_path}'.")
+            return ModelLoader.load_async(self.group_name, model_path)
+        logging.error(f"Modelo para o grupo '{self.group_name}' não encontrado em '{model_path}'.")
+        ModelLoader.set_failed(self.group_name, f"Modelo não encontrado em '{model_path}'")
+        self.model_loaded = False
+        return None
+
+    def wait_for_model(self):
+        """Aguarda o carregamento (na thread do processador, nunca em uma rota) e fixa o modelo no cache."""
+        # Recarrega do cache: um modelo reenviado tem outro hash e é carregado de novo
+        future = self.load_model()
+        if future is None:
+            return False
+        try:
+            self.model = future.result()
+        except Exception as e:
+            self.model = None
             self.model_loaded = False
+            logging.error(f"Erro ao carregar o modelo para o grupo '{self.group_name}': {e}")
+            return False
+        ModelCache.pin(self.model)
+        self.pinned_model = self.model
+        self.model_loaded = True
+        logging.info(f"Modelo carregado com sucesso para o grupo '{self.group_name}'")
+        return True
+
+    def release_model(self):
+        """Libera o modelo para que o cache LRU possa removê-lo se faltar memória."""
+        if self.pinned_model is not None:
+            ModelCache.unpin(self.pinned_model)
+            self.pinned_model = None
+        self.model = None
+        self.model_loaded = False
+        self.last_results = None
+        self.results_image = None
+        self.last_grabbed = None
+        self.motion_gate.reset()
 
     def start_processing(self):
         if not self.processing_active:
             self.processing_active = True
             self.capturing = True
             self.stop_event.clear()  # Limpa o evento de parada
-            self.capture_thread = threading.Thread(target=self.process_live_video, daemon=True)
+            self.capture_thread = threading.Thread(target=self.process_live_video, name=f"live-{self.group_name}", daemon=True)
             self.capture_thread.start()
             logging.info(f"Iniciado processamento para o grupo {self.group_name}.")
         else:
@@ -119,86 +214,189 @@ class GroupProcessor:
                     logging.warning(f"Thread de captura não parou dentro do tempo para o grupo {self.group_name}.")
                 else:
                     logging.info(f"Thread de captura parada para o grupo {self.group_name}.")
+            self.release_model()
             logging.info(f"Processamento parado para o grupo {self.group_name}.")
         else:
             logging.warning(f"Processamento não está ativo para o grupo {self.group_name}.")
 
 
     def process_live_video(self):
-        if not self.model_loaded:
+        if not self.wait_for_model():
             logging.error(f"Modelo não carregado para o grupo {self.group_name}.")
+            self.processing_active = False
+            self.capturing = False
+            return
+        if self.stop_event.is_set():
+            # O processamento foi parado enquanto o modelo carregava
+            self.release_model()
             return
 
-        while not self.stop_event.is_set():
-            try:
-                logging.debug(f"Processando vídeo ao vivo para o grupo {self.group_name}.")
-                # Captura a imagem da câmera
-                self.camera_url = app.config['CAMERA_URL']
-                img_resp = urllib.request.urlopen(self.camera_url, timeout=5)
-                imgnp = np.array(bytearray(img_resp.read()), dtype=np.uint8)
-                img = cv2.imdecode(imgnp, -1)
-
-                results = self.model(img)
-                self.frame = np.squeeze(results.render())
+        # Inscreve o processador no grabber compartilhado da câmera
+        grabber = self.grabber = FrameGrabber.acquire(self.camera_url, self.camera_mode, self.camera_timeout)
+        last_seq = 0
+        self.rate_controller.reset()
+        try:
+            while not self.stop_event.is_set():
+                iteration_start = time.time()
+                try:
+                    logging.debug(f"Processando vídeo ao vivo para o grupo {self.group_name}.")
+                    # Troca de grabber se a URL ou o modo da câmera foram alterados nas configurações
+                    if not grabber.matches(self.camera_url, self.camera_mode):
+                        FrameGrabber.release(grabber)
+                        grabber = self.grabber = FrameGrabber.acquire(self.camera_url, self.camera_mode, self.camera_timeout)
+                        last_seq = 0
+
+                    grabbed = grabber.wait_for_frame(last_seq, timeout=5)
+                    if grabbed is None:
+                        continue
+                    last_seq = grabbed.seq
+
+                    # A inferência roda no escalonador central; quadros antigos são descartados
+                    future = inference_scheduler.submit(self.group_name, self.process_grabbed_frame, grabbed)
+                    future.add_done_callback(self._frame_done)
+                except Exception as e:
+                    logging.error(f"Erro no processamento de vídeo ao vivo para o grupo {self.group_name}: {e}",
+                                  exc_info=True, extra={'group': self.group_name})
+                # Ritmo adaptativo: desconta o tempo da iteração do intervalo calculado pelo controlador
+                interval = self.rate_controller.interval(watched=self.publisher.has_viewers())
+                self.stop_event.wait(max(0.0, interval - (time.time() - iteration_start)))
+        finally:
+            self.grabber = None
+            FrameGrabber.release(grabber)
+            inference_scheduler.unregister(self.group_name)
+
+    def profiled_threads(self):
+        """Threads que trabalham para o grupo agora: o laço ao vivo, a câmera e os workers com job do grupo."""
+        threads = {}
+        if self.capture_thread is not None and self.capture_thread.is_alive():
+            threads[self.capture_thread.ident] = f"live-loop {self.group_name}"
+        grabber = self.grabber
+        if grabber is not None and grabber.thread is not None:
+            threads[grabber.thread.ident] = f"camera {grabber.camera_url}"
+        for ident in inference_scheduler.threads_for(self.group_name):
+            threads[ident] = f"inference {self.group_name}"
+        return threads
+
+    def model_status(self):
+        return ModelLoader.status(self.group_name)
+
+    def process_grabbed_frame(self, grabbed):
+        start = time.time()
+        # Tempo entre a captura do quadro e o início do processamento (fila do escalonador)
+        registry.observe('pipeline_stage_seconds', start - grabbed.timestamp, group=self.group_name, stage='queue')
+        self.process_frame(grabbed)
+        finished = time.time()
+        self.rate_controller.record(latency=finished - grabbed.timestamp, busy=finished - start)
+
+    def _frame_done(self, future):
+        if future.cancelled():
+            registry.inc('frames_total', group=self.group_name, result='dropped')
+            self.rate_controller.record_drop()
+
+    def process_frame(self, grabbed):
+        img = grabbed.image
+        self.last_grabbed = grabbed
+        # Cena parada: reaproveita as detecções anteriores em vez de rodar o detector
+        if not self.motion_gate.should_infer(img, grabbed.raw_hash, force=self.last_results is None):
+            registry.inc('frames_total', group=self.group_name, result='skipped')
+            self.process_detections(self.last_results, grabbed)
+            return
 
-                self.process_detections(results, img)
-                logging.debug(f"Detecções processadas para o grupo {self.group_name}.")
-            except Exception as e:
-                logging.error(f"Erro no processamento de vídeo ao vivo para o grupo {self.group_name}: {e}")
-                traceback.print_exc()
-            time.sleep(0.1)
+        with registry.time('pipeline_stage_seconds', group=self.group_name, stage='inference'):
+            results = inference_profile.run(self.model, img)
+        registry.inc('frames_total', group=self.group_name, result='inferred')
+        self.set_results(results, img)
+        self.process_detections(results, grabbed)
+        logging.debug(f"Detecções processadas para o grupo {self.group_name}.")
 
 
 
-    def process_detections(self, results, img):
+    def process_detections(self, results, grabbed):
         current_time = time.time()
-        detections = results.xyxy[0]  # Tensor com detecções
+        detections = results.xyxy[0]  # Tensor (torch) ou array (onnx) com detecções
 
         if len(detections) > 0:
+            if hasattr(detections, 'cpu'):
+                detections = detections.cpu().numpy()
+            # Não filtra classes: a detecção com maior confiança entre todas vai para o ranking
+            class_name, confidence_score = best_detection(detections, self.model.names)
+
+            # Se estamos no intervalo certo para capturar (a cada 2 segundos)
+            if self.capturing and (current_time - self.last_capture_time >= 2):
+                # Salvar a imagem em segundo plano; o ranking recebe a melhor detecção após a gravação
+                self.save_capture(self.capture_frame(grabbed, detections), class_name, confidence_score)
+                self.last_capture_time = current_time
+
+    def set_results(self, results, image):
+        """Guarda o resultado bruto; as caixas só são desenhadas se alguém estiver assistindo."""
+        with self.render_lock:
+            self.last_results = results
+            self.results_image = image
+            self.results_seq += 1
+        if self.publisher.has_viewers():
+            self.publish_frame()
+
+    def annotated_frame(self):
+        """Desenha as detecções do último resultado, no máximo uma vez por resultado."""
+        model = self.model
+        with self.render_lock:
+            if self.rendered_seq != self.results_seq and self.last_results is not None and model is not None:
+                with registry.time('pipeline_stage_seconds', group=self.group_name, stage='render'):
+                    # O quadro é compartilhado e somente leitura: desenha em uma cópia
+                    detections = self.last_results.xyxy[0]
+                    if hasattr(detections, 'cpu'):
+                        detections = detections.cpu().numpy()
+                    self.frame = draw_detections(self.results_image.copy(), detections, model.names)
+                self.rendered_seq = self.results_seq
+            return self.frame
+
+    def publish_frame(self):
+        """Publica o último resultado para os clientes, se ainda não foi publicado."""
+        with self.render_lock:
+            frame = self.annotated_frame()
+            if frame is not None and self.publisher.seq < self.rendered_seq:
+                with registry.time('pipeline_stage_seconds', group=self.group_name, stage='encode'):
+                    self.publisher.publish(frame, seq=self.rendered_seq)
+
+    def capture_frame(self, grabbed, detections):
+        """Quadro a ser salvo, anotado a partir das detecções e em resolução cheia.
+
+        Retorna uma função chamada pelo gravador, então o desenho (e a nova decodificação do JPEG
+        original, quando o quadro foi reduzido) só acontece fora da thread de inferência e quando
+        a captura é realmente salva.
+        """
+        names = self.model.names
+
+        def render_full_resolution():
+            img = full_resolution_image(grabbed.jpeg, grabbed.image, grabbed.scale)
+            return draw_detections(img, detections, names, scale=grabbed.scale)
+
+        return render_full_resolution
+
+    def current_capture_frame(self):
+        """Captura em resolução cheia do quadro atual com as últimas detecções; None se ainda não há resultado."""
+        with self.render_lock:
+            grabbed, results = self.last_grabbed, self.last_results
+        if grabbed is None or results is None or self.model is None:
+            return None
+        detections = results.xyxy[0]
+        if hasattr(detections, 'cpu'):
             detections = detections.cpu().numpy()
-            class_names = [self.model.names[int(cls_id)] for cls_id in detections[:, 5]]  # Pega o nome de todas as classes detectadas
-
-            # Não filtra mais classes, considera todas as detecções
-            filtered_indices = range(len(class_names))  # Considera todos os índices, sem filtro
-
-            if filtered_indices:
-                # Achar a detecção com maior confiança
-                best_detection = detections[np.argmax(detections[:, 4])]  # A maior confiança entre todas as detecções
-                confidence_score = float(best_detection[4])
-                class_name = self.model.names[int(best_detection[5])]
-
-                # Se estamos no intervalo certo para capturar (a cada 2 segundos)
-                if self.capturing and (current_time - self.last_capture_time >= 2):  
-                    filename = f"capture_{int(current_time * 1000)}.jpg"
-                    filepath = os.path.join(self.group_capture_dir, filename)
-                    
-                    # Salvar a imagem no diretório
-                    cv2.imwrite(filepath, self.frame)
-
-                    # Atualizar ranking data com a melhor detecção
-                    with ranking_data_lock:
-                        load_ranking_data()
-                        group_entry = get_group_entry(self.group_name)
-
-                        # Atualizar a entrada com a detecção de maior confiança
-                        img_info = {'image_filename': filename, 'class': class_name, 'confidence': confidence_score}
-                        group_entry['images'].append(img_info)
+        return self.capture_frame(grabbed, detections)
 
-                        # Reordenar imagens pela confiança e selecionar as 3 melhores
-                        sorted_images = sorted(group_entry['images'], key=lambda x: x['confidence'], reverse=True)
-                        top_images = sorted_images[:3]
-                        group_entry['top_images'] = top_images
-                        group_entry['accuracy'] = sum(img['confidence'] for img in top_images) / len(top_images) if top_images else 0.0
-
-                        save_ranking_data()
-
-                    self.last_capture_time = current_time
-                    logging.info(f"Imagem capturada e salva: {filename} para o grupo {self.group_name}.")
+    def save_capture(self, frame, class_name, confidence, timeout=None):
+        """Envia a captura ao gravador; o ranking é atualizado quando o arquivo estiver gravado."""
+        filename = f"capture_{int(time.time() * 1000)}.jpg"
+        filepath = os.path.join(self.group_capture_dir, filename)
 
+        def on_written(filename):
+            ranking_store.add_image(self.group_name, filename, class_name, confidence)
+            logging.debug(f"Imagem capturada e salva: {filename} para o grupo {self.group_name}.")
 
+        return capture_writer.submit(frame, filepath, on_written, timeout=timeout, group_name=self.group_name)
 
     def get_frame(self):
-        return self.frame
+        return self.annotated_frame()
 
     def start_continuous_capture(self, duration):
         """Inicia a captura contínua em uma thread separada."""
@@ -214,59 +412,53 @@ class GroupProcessor:
     def _capture_images_for_duration(self, duration):
         """Método interno para capturar imagens por uma duração especificada."""
         start_time = time.time()
-        while not self.stop_event.is_set() and (time.time() - start_time) < duration:
-            # Captura a imagem
-            self.capture_image()
-            
-            # Dorme em intervalos pequenos para permitir uma parada mais rápida
-            for _ in range(40):  # 40 * 0.05 = 2 segundos
-                if self.stop_event.is_set():
-                    break
-                time.sleep(0.05)  # 0.05 segundos
+        grabber = FrameGrabber.acquire(self.camera_url, self.camera_mode, self.camera_timeout)
+        try:
+            while not self.stop_event.is_set() and (time.time() - start_time) < duration:
+                if not grabber.matches(self.camera_url, self.camera_mode):
+                    FrameGrabber.release(grabber)
+                    grabber = FrameGrabber.acquire(self.camera_url, self.camera_mode, self.camera_timeout)
+
+                # Captura a imagem
+                self.capture_image(grabber)
+
+                # Dorme em intervalos pequenos para permitir uma parada mais rápida
+                for _ in range(40):  # 40 * 0.05 = 2 segundos
+                    if self.stop_event.is_set():
+                        break
+                    time.sleep(0.05)  # 0.05 segundos
+        finally:
+            FrameGrabber.release(grabber)
         self.capturing = False
         logging.info(f"Captura contínua finalizada para o grupo {self.group_name}.")
 
 
-    def capture_image(self):
+    def capture_image(self, grabber):
         try:
-            # Atualizar a URL da câmera antes de capturar
-            self.camera_url = app.config['CAMERA_URL']
-            img_resp = urllib.request.urlopen(self.camera_url, timeout=3)
-            imgnp = np.array(bytearray(img_resp.read()), dtype=np.uint8)
-            img = cv2.imdecode(imgnp, -1)
+            grabbed = grabber.wait_for_frame(timeout=3)
+            if grabbed is None:
+                logging.error(f"Nenhum quadro disponível da câmera {grabber.camera_url} para o grupo {self.group_name}.",
+                              extra={'group': self.group_name})
+                return
+            img = grabbed.image
 
             if not self.model_loaded:
-                logging.error(f"Modelo não carregado para o grupo {self.group_name}.")
+                logging.error(f"Modelo não carregado para o grupo {self.group_name}.", extra={'group': self.group_name})
                 return
 
-            results = self.model(img)
-            self.frame = np.squeeze(results.render())
-
-            filename = f"capture_{int(time.time() * 1000)}.jpg"
-            filepath = os.path.join(self.group_capture_dir, filename)
-            cv2.imwrite(filepath, self.frame)
-
-            logging.info(f"Imagem capturada e salva: {filename} para o grupo {self.group_name}.")
+            results = inference_scheduler.call(self.group_name, inference_profile.run, self.model, img, timeout=30)
+            self.last_grabbed = grabbed
+            self.set_results(results, img)
 
-            # Atualizar ranking data
-            with ranking_data_lock:
-                load_ranking_data()
-                group_entry = get_group_entry(self.group_name)
-
-                # Definir 'confidence' como 0.0 em vez de None
-                img_info = {'image_filename': filename, 'class': None, 'confidence': 0.0}
-                group_entry['images'].append(img_info)
-
-                sorted_images = sorted(group_entry['images'], key=lambda x: x.get('confidence', 0.0), reverse=True)
-                top_images = sorted_images[:3]
-                group_entry['top_images'] = top_images
-                group_entry['accuracy'] = sum(img.get('confidence', 0.0) for img in top_images) / len(top_images) if top_images else 0.0
-
-                save_ranking_data()
+            detections = results.xyxy[0]
+            if hasattr(detections, 'cpu'):
+                detections = detections.cpu().numpy()
+            # Salvar em segundo plano ('confidence' 0.0 em vez de None); aguarda espaço na fila
+            self.save_capture(self.capture_frame(grabbed, detections), None, 0.0, timeout=2)
 
         except Exception as e:
-            logging.error(f"Erro ao capturar imagem para o grupo {self.group_name}: {e}")
-            traceback.print_exc()
+            logging.error(f"Erro ao capturar imagem para o grupo {self.group_name}: {e}",
+                          exc_info=True, extra={'group': self.group_name})
 
 
     def stop_continuous_capture(self):
@@ -285,37 +477,101 @@ class GroupProcessor:
             logging.warning("Nenhuma captura contínua está em andamento.")
 
 
-# Funções para Gerenciamento de Dados
-def load_ranking_data():
-    global ranking_data
-    with ranking_data_lock:
-        try:
-            if os.path.exists('ranking.json'):
-                with open('ranking.json', 'r') as f:
-                    ranking_data = json.load(f)
-                logging.info("ranking_data carregado de ranking.json")
-            else:
-                ranking_data = []
-                logging.warning("ranking.json não encontrado. Iniciando ranking_data como lista vazia.")
-        except json.JSONDecodeError as e:
-            logging.error(f"Erro ao decodificar ranking.json: {e}")
-            ranking_data = []
-        except Exception as e:
-            logging.critical(f"Erro inesperado ao carregar ranking_data: {e}")
-            ranking_data = []
-
-def save_ranking_data():
-    global ranking_data
-    with ranking_data_lock:
-        try:
-            with open('ranking.json', 'w') as f:
-                json.dump(ranking_data, f, default=default_serializer, indent=4)
-            logging.info("ranking_data salvo em ranking.json")
-        except Exception as e:
-            logging.error(f"Erro ao salvar ranking_data: {e}")
-            traceback.print_exc()
+def group_camera(group_name):
+    """URL, modo e timeout da câmera do grupo em groups.json, com os de settings.json como padrão."""
+    group = groups.get(group_name) or {}
+    return (
+        group.get('camera_url') or app.config['CAMERA_URL'],
+        group.get('camera_mode') or app.config['CAMERA_MODE'],
+        group.get('camera_timeout') or app.config['CAMERA_TIMEOUT'],
+    )
+
+def group_worker_config(group_name):
+    """Configuração de um grupo nos modos 'process' e 'pool', montada na hora de iniciá-lo."""
+    camera_url, camera_mode, camera_timeout = group_camera(group_name)
+    return {
+        'model_path': groups.get(group_name, {}).get('model'),
+        'camera_url': camera_url,
+        'camera_mode': camera_mode,
+        'camera_timeout': camera_timeout,
+        'settings': settings,
+        'ranking_db': app.config['RANKING_DB'],
+        'log_file': app.config['LOG_FILE'],
+    }
+
+# Quem inicia os processos worker: um por grupo ('process') ou o pool fixo ('pool')
+if app.config['PROCESSING_MODE'] == 'pool':
+    worker_launcher = WorkerPool(
+        group_worker_config,
+        control_authkey(app.config['SECRET_KEY']),
+        size=settings.get('pool_workers'),
+        cores_per_worker=settings.get('pool_cores_per_worker', 1),
+        capacity=settings.get('pool_groups_per_worker', 2)
+    )
+elif app.config['PROCESSING_MODE'] == 'process':
+    worker_launcher = ProcessLauncher(group_worker_config, control_authkey(app.config['SECRET_KEY']))
+else:
+    worker_launcher = None
+
+def new_group_processor(group_name):
+    if worker_launcher is not None:
+        return WorkerGroupProcessor(group_name, worker_launcher, control_authkey(app.config['SECRET_KEY']))
+    return GroupProcessor(group_name)
+
+def find_group_processor(group_name):
+    """Processador do grupo; nos modos com workers também encontra grupos iniciados por outro processo web."""
+    with group_processors_lock:
+        group_processor = group_processors.get(group_name)
+        if group_processor is None and worker_launcher is not None and worker_running(group_name):
+            group_processor = group_processors[group_name] = new_group_processor(group_name)
+        return group_processor
 
+def rebalance_inference_threads():
+    """Reparte as threads do PyTorch entre os grupos com processamento ao vivo ativo."""
+    with group_processors_lock:
+        active = sum(1 for processor in group_processors.values() if processor.processing_active)
+    inference_profile.rebalance_threads(active, inference_scheduler.num_workers)
+
+# Métricas lidas só na coleta de /metrics a partir das estatísticas que os componentes já mantêm
+registry.describe('live_effective_fps', 'gauge', 'FPS efetivo do processamento ao vivo por grupo.')
+registry.describe('inference_queue_pending', 'gauge', 'Quadros aguardando inferência por grupo.')
+registry.describe('capture_queue_depth', 'gauge', 'Capturas aguardando gravação.')
+registry.describe('capture_writes_total', 'counter', 'Capturas por resultado (written, failed, dropped).')
+registry.describe('model_cache_resident_bytes', 'gauge', 'Memória estimada dos modelos em cache.')
+registry.describe('model_cache_requests_total', 'counter', 'Acessos ao cache de modelos por resultado (hit, miss).')
+registry.describe('camera_frames_total', 'counter', 'Quadros publicados por câmera e origem (decoded, reused).')
+
+def collect_metrics():
+    with group_processors_lock:
+        processors = dict(group_processors)
+    for group_name, processor in processors.items():
+        yield 'live_effective_fps', {'group': group_name}, processor.rate_controller.effective_fps()
+    for group_name, queue_stats in inference_scheduler.stats().items():
+        yield 'inference_queue_pending', {'group': group_name}, queue_stats['pending']
+    writer_stats = capture_writer.stats()
+    yield 'capture_queue_depth', {}, writer_stats['queue_depth']
+    for result in ('written', 'failed', 'dropped'):
+        yield 'capture_writes_total', {'result': result}, writer_stats[result]
+    cache_stats = ModelCache.stats()
+    yield 'model_cache_resident_bytes', {}, cache_stats['resident_bytes']
+    yield 'model_cache_requests_total', {'result': 'hit'}, cache_stats['hits']
+    yield 'model_cache_requests_total', {'result': 'miss'}, cache_stats['misses']
+    for camera_url, camera_stats in FrameGrabber.stats().items():
+        yield 'camera_frames_total', {'camera': camera_url, 'source': 'decoded'}, camera_stats['decoded']
+        yield 'camera_frames_total', {'camera': camera_url, 'source': 'reused'}, camera_stats['decode_skips']
+
+registry.add_collector(collect_metrics)
+
+# Registro das threads que atendem requisições, para o profiler amostrar o caminho do Flask
+@app.before_request
+def track_request_thread():
+    active_requests[threading.get_ident()] = request.path
+
+@app.teardown_request
+def untrack_request_thread(exc):
+    active_requests.pop(threading.get_ident(), None)
 
+# Funções para Gerenciamento de Dados
 def load_groups():
     global groups
     if os.path.exists('groups.json'):
@@ -324,8 +580,7 @@ def load_groups():
                 groups = json.load(f)
             logging.info(f"Grupos carregados de groups.json: {groups}")
         except Exception as e:
-            logging.error(f"Erro ao carregar grupos de groups.json: {e}")
-            traceback.print_exc()
+            logging.error(f"Erro ao carregar grupos de groups.json: {e}", exc_info=True)
             groups = {}
     else:
         groups = {}
@@ -338,22 +593,7 @@ def save_groups():
             json.dump(groups, f, indent=4)
         logging.info("Grupos salvos com sucesso em groups.json")
     except Exception as e:
-        logging.error(f"Erro ao salvar grupos em groups.json: {e}")
-        traceback.print_exc()
-
-def get_group_entry(group_name):
-    global ranking_data
-    with ranking_data_lock:
-        group_entry = next((entry for entry in ranking_data if entry['group'] == group_name), None)
-        if group_entry is None:
-            group_entry = {
-                'group': group_name,
-                'accuracy': 0.0,
-                'images': [],
-                'top_images': []
-            }
-            ranking_data.append(group_entry)
-        return group_entry
+        logging.error(f"Erro ao salvar grupos em groups.json: {e}", exc_info=True)
 
 # Rotas de Autenticação
 @app.route('/', methods=['GET', 'POST'])
@@ -405,6 +645,13 @@ def register_group():
         if model_file.filename == '':
             flash('Nenhum arquivo selecionado.', 'error')
             return redirect(url_for('register_group'))
+
+        # Câmera própria do grupo (opcional); sem URL o grupo usa a câmera das configurações
+        camera_url = request.form.get('camera_url', '').strip()
+        camera_mode = request.form.get('camera_mode', 'snapshot').strip()
+        if camera_url and camera_mode not in CAMERA_MODES:
+            flash('Modo de câmera inválido.', 'error')
+            return redirect(url_for('register_group'))
         
         if model_file and allowed_file(model_file.filename):
             filename = secure_filename_custom(model_file.filename)
@@ -415,8 +662,14 @@ def register_group():
             
             if os.path.exists(model_path):
                 logging.info(f"Modelo salvo com sucesso em: {model_path}")
+                # Carrega e aquece o modelo em segundo plano, antes do primeiro processamento ao vivo
+                ModelLoader.load_async(group_name, model_path)
                 load_groups()
-                groups[group_name] = {'model': model_path}
+                # Reenviar o modelo mantém a câmera já configurada para o grupo
+                group = dict(groups.get(group_name, {}), model=model_path)
+                if camera_url:
+                    group.update(camera_url=camera_url, camera_mode=camera_mode)
+                groups[group_name] = group
                 save_groups()
                 session['group_name'] = group_name
                 session['model_name'] = os.path.basename(model_path)
@@ -430,7 +683,7 @@ def register_group():
             flash('Tipo de arquivo inválido. Por favor, envie um arquivo .pt.', 'error')
             return redirect(url_for('register_group'))
     
-    return render_template('register_group.html')
+    return render_template('register_group.html', camera_modes=CAMERA_MODES)
 
 # Rota para Selecionar Grupo
 @app.route('/select_group', methods=['GET', 'POST'])
@@ -460,11 +713,8 @@ def live_verification():
         return redirect(url_for('login'))
 
     group_name = session.get('group_name', 'Anônimo')
-    with group_processors_lock:
-        processing_active = False
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            processing_active = group_processor.processing_active
+    group_processor = find_group_processor(group_name)
+    processing_active = group_processor is not None and group_processor.processing_active
     return render_template('live_verification.html', processing_active=processing_active)
 
 # Rota para Iniciar Processamento ao Vivo
@@ -478,12 +728,22 @@ def start_live_processing():
         flash('Selecione um grupo antes de iniciar o processamento ao vivo.', 'error')
         return redirect(url_for('select_group'))
 
-    with group_processors_lock:
-        if group_name not in group_processors:
-            group_processors[group_name] = GroupProcessor(group_name)
-    
-    group_processor = group_processors[group_name]
-    group_processor.start_processing()
+    group_processor = find_group_processor(group_name)
+    if group_processor is None:
+        with group_processors_lock:
+            if group_name not in group_processors:
+                group_processors[group_name] = new_group_processor(group_name)
+            group_processor = group_processors[group_name]
+    try:
+        group_processor.start_processing()
+    except PoolFullError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('live_verification'))
+    except RuntimeError as e:
+        logging.error(f"Erro ao iniciar o processamento ao vivo para o grupo {group_name}: {e}")
+        flash(f'Erro ao iniciar o processamento ao vivo: {e}', 'error')
+        return redirect(url_for('live_verification'))
+    rebalance_inference_threads()
     flash('Processamento ao vivo iniciado.', 'success')
     return redirect(url_for('live_verification'))
 
@@ -498,44 +758,86 @@ def stop_live_processing():
         flash('Nenhum grupo selecionado para parar o processamento.', 'error')
         return redirect(url_for('select_group'))
 
-    with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            group_processor.stop_processing()
-            flash('Processamento ao vivo parado.', 'success')
-        else:
-            flash('Processador de grupo não encontrado.', 'error')
+    group_processor = find_group_processor(group_name)
+    if group_processor is not None:
+        group_processor.stop_processing()
+        flash('Processamento ao vivo parado.', 'success')
+    else:
+        flash('Processador de grupo não encontrado.', 'error')
+    rebalance_inference_threads()
     return redirect(url_for('live_verification'))
 
-# Feed de Vídeo ao Vivo
+# Feed de Vídeo ao Vivo (polling; mantido por compatibilidade)
 @app.route('/live_feed')
 def live_feed():
     group_name = session.get('group_name', 'Anônimo')
-    with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            frame = group_processor.get_frame()
-            if frame is not None:
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if ret:
-                    response = make_response(buffer.tobytes())
-                    response.headers['Content-Type'] = 'image/jpeg'
-                    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                    response.headers['Pragma'] = 'no-cache'
-                    response.headers['Expires'] = '0'
-                    return response
+    group_processor = find_group_processor(group_name)
+    if group_processor is not None:
+        group_processor.publisher.touch()
+        group_processor.publish_frame()
+        _, jpeg = group_processor.publisher.latest()
+        if jpeg is not None:
+            response = make_response(jpeg)
+            response.headers['Content-Type'] = 'image/jpeg'
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '0'
+            return response
     return '', 204
 
+# Stream de Vídeo ao Vivo (multipart/x-mixed-replace)
+@app.route('/live_stream')
+def live_stream():
+    group_name = session.get('group_name', 'Anônimo')
+    group_processor = find_group_processor(group_name)
+    if group_processor is None:
+        return '', 204
+
+    min_interval = 1.0 / max(float(app.config['LIVE_STREAM_MAX_FPS']), 0.1)
+
+    def generate():
+        last_seq = 0
+        last_sent = 0.0
+        # Enquanto houver cliente inscrito, o processador roda na taxa cheia
+        group_processor.publisher.subscribe()
+        group_processor.publish_frame()
+        try:
+            while group_processor.processing_active or group_processor.capturing:
+                # Limita o FPS por cliente
+                delay = min_interval - (time.time() - last_sent)
+                if delay > 0:
+                    time.sleep(delay)
+                last_seq, jpeg = group_processor.publisher.wait(last_seq, timeout=5)
+                if jpeg is None:
+                    continue
+                last_sent = time.time()
+                yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' +
+                       str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            group_processor.publisher.unsubscribe()
+
+    response = Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
 # Rota para Checar Status do Modelo/Processamento
 @app.route('/check_model_status')
 def check_model_status():
     group_name = session.get('group_name', 'Anônimo')
-    with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            if group_processor.model_loaded and group_processor.processing_active:
-                return '', 200
-    return '', 503
+    group_processor = find_group_processor(group_name)
+    model_status = group_processor.model_status() if group_processor is not None else ModelLoader.status(group_name)
+    if group_processor is not None and group_processor.model_loaded and group_processor.processing_active:
+        return jsonify(model_status), 200
+    return jsonify(model_status), 503
+
+# Taxa de Quadros do Processamento ao Vivo (exibida na página de verificação)
+@app.route('/live_rate')
+def live_rate():
+    group_name = session.get('group_name', 'Anônimo')
+    group_processor = find_group_processor(group_name)
+    if group_processor is None or not group_processor.processing_active:
+        return jsonify({'processing_active': False}), 404
+    return jsonify(dict(group_processor.rate_controller.stats(), processing_active=True))
 
 # Rota para Capturar Imagem ao Vivo
 @app.route('/capture_live_image', methods=['POST'])
@@ -547,35 +849,109 @@ def capture_live_image():
     if not group_name or group_name == 'Anônimo':
         return "Nenhum grupo selecionado.", 400
 
+    group_processor = find_group_processor(group_name)
+    if group_processor is None:
+        return 'Processador de grupo não encontrado', 400
+    if isinstance(group_processor, WorkerGroupProcessor):
+        ok, message = group_processor.capture_now()
+        return message, 200 if ok else 503
+
+    # A gravação (e a decodificação em resolução cheia) acontece em segundo plano, fora do group_processors_lock
+    frame = group_processor.current_capture_frame()
+    if frame is None:
+        return "Nenhuma imagem disponível para capturar.", 500
+    if not group_processor.save_capture(frame, None, None):
+        return "Fila de gravação cheia. Tente novamente.", 503
+    return "Imagem capturada com sucesso.", 200
+
+# Estatísticas do Gravador de Capturas
+@app.route('/capture_stats')
+def capture_stats():
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    return jsonify(capture_writer.stats())
+
+# Métricas no formato texto do Prometheus (sessão logada ou 'metrics_token' em settings.json)
+@app.route('/metrics')
+def metrics():
+    token = settings.get('metrics_token')
+    authorized = session.get('logged_in') or (token and request.headers.get('Authorization') == f'Bearer {token}')
+    if not authorized:
+        abort(401)
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+# Estatísticas do Processamento ao Vivo (pré-filtro de movimento, escalonador e câmeras)
+@app.route('/processing_stats')
+def processing_stats():
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    if worker_launcher is not None:
+        for group_name in list(groups):
+            find_group_processor(group_name)  # Inclui workers iniciados por outros processos web
     with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            if group_processor.frame is not None:
-                filename = f"capture_{int(time.time() * 1000)}.jpg"
-                filepath = os.path.join(group_processor.group_capture_dir, filename)
-                cv2.imwrite(filepath, group_processor.frame)
-                logging.info(f"Imagem capturada e salva: {filename} para o grupo {group_name}.")
-
-                # Atualizar ranking data
-                with ranking_data_lock:
-                    load_ranking_data()
-                    group_entry = get_group_entry(group_name)
-
-                    img_info = {'image_filename': filename, 'class': None, 'confidence': None}
-                    group_entry['images'].append(img_info)
-
-                    sorted_images = sorted(group_entry['images'], key=lambda x: x.get('confidence', 0), reverse=True)
-                    top_images = sorted_images[:3]
-                    group_entry['top_images'] = top_images
-                    group_entry['accuracy'] = sum(img.get('confidence', 0) for img in top_images) / len(top_images) if top_images else 0.0
-
-                    save_ranking_data()
-
-                return "Imagem capturada com sucesso.", 200
-            else:
-                return "Nenhuma imagem disponível para capturar.", 500
-        else:
-            return 'Processador de grupo não encontrado', 400
+        processors = dict(group_processors)
+    scheduler_stats = inference_scheduler.stats()
+    stats = {
+        'groups': {
+            group_name: {
+                'processing_active': processor.processing_active,
+                'motion_gate': processor.motion_gate.stats(),
+                'rate': processor.rate_controller.stats(),
+                'scheduler': scheduler_stats.get(group_name, {}),
+            }
+            for group_name, processor in processors.items()
+        },
+        'cameras': FrameGrabber.stats(),
+    }
+    if isinstance(worker_launcher, WorkerPool):
+        stats['pool'] = worker_launcher.stats()  # Grupos, modelos residentes e threads por worker
+    return jsonify(stats)
+
+# Profiler por amostragem sob demanda (somente admin): pilhas colapsadas e funções mais frequentes
+@app.route('/admin/profile')
+def admin_profile():
+    if not session.get('logged_in') or session.get('username') != 'admin':
+        abort(403)
+    target = request.args.get('target', 'group')
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', 10, type=float)
+
+    if target == 'requests':
+        profiler_ident = threading.get_ident()
+
+        def select_threads():
+            return {
+                ident: f"request {path}"
+                for ident, path in list(active_requests.items()) if ident != profiler_ident
+            }
+    elif target == 'group':
+        group_name = request.args.get('group') or session.get('group_name')
+        group_processor = find_group_processor(group_name)
+        if group_processor is None or not group_processor.processing_active:
+            return jsonify({'error': f"Processamento ao vivo não está ativo para o grupo {group_name}."}), 404
+        select_threads = group_processor.profiled_threads
+    else:
+        return jsonify({'error': "Parâmetro 'target' deve ser 'group' ou 'requests'."}), 400
+
+    profiler = SamplingProfiler(select_threads, interval=interval_ms / 1000.0)
+    logging.info(f"Profiler iniciado por {seconds}s (alvo: {target}).")
+    if not profiler.run(seconds):
+        return jsonify({'error': "Já existe uma sessão de profiling em andamento."}), 409
+
+    if request.args.get('format') == 'collapsed':
+        response = make_response(profiler.collapsed())
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        return response
+    return jsonify(dict(profiler.summary(), target=target))
+
+# Estatísticas do Cache de Modelos
+@app.route('/model_cache_stats')
+def model_cache_stats():
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    return jsonify(ModelCache.stats())
 
 # Rota para Iniciar Captura Contínua
 @app.route('/start_continuous_capture', methods=['POST'])
@@ -593,14 +969,18 @@ def start_continuous_capture_route():
     if not group_name or group_name == 'Anônimo':
         return 'Nenhum grupo selecionado', 400
 
-    with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            group_processor.start_continuous_capture(duration)
-            flash('Captura contínua iniciada.', 'success')
-            return '', 200
+    group_processor = find_group_processor(group_name)
+    if group_processor is not None:
+        if isinstance(group_processor, WorkerGroupProcessor):
+            ok, message = group_processor.start_continuous_capture(duration)
+            if not ok:
+                return message, 503
         else:
-            return 'Processador de grupo não encontrado', 400
+            group_processor.start_continuous_capture(duration)
+        flash('Captura contínua iniciada.', 'success')
+        return '', 200
+    else:
+        return 'Processador de grupo não encontrado', 400
 
 # Rota para Parar Captura Contínua
 @app.route('/stop_continuous_capture', methods=['POST'])
@@ -613,14 +993,18 @@ def stop_continuous_capture_route():
     if not group_name or group_name == 'Anônimo':
         return 'Nenhum grupo selecionado', 400
 
-    with group_processors_lock:
-        if group_name in group_processors:
-            group_processor = group_processors[group_name]
-            group_processor.stop_continuous_capture()
-            flash('Captura contínua parada.', 'success')
-            return '', 200
+    group_processor = find_group_processor(group_name)
+    if group_processor is not None:
+        if isinstance(group_processor, WorkerGroupProcessor):
+            ok, message = group_processor.stop_continuous_capture()
+            if not ok:
+                return message, 503
         else:
-            return 'Processador de grupo não encontrado', 400
+            group_processor.stop_continuous_capture()
+        flash('Captura contínua parada.', 'success')
+        return '', 200
+    else:
+        return 'Processador de grupo não encontrado', 400
 
 # Rota para Visualizar Imagens Processadas
 @app.route('/view_processed_images')
@@ -633,15 +1017,32 @@ def view_processed_images():
         flash('Selecione um grupo para visualizar as imagens processadas.', 'error')
         return redirect(url_for('select_group'))
 
-    load_ranking_data()
-    group_entry = next((entry for entry in ranking_data if entry['group'] == group_name), None)
-    if group_entry and 'images' in group_entry:
-        images = group_entry['images']
-        top_images = group_entry.get('top_images', [])
-    else:
-        images = []
-        top_images = []
-    return render_template('view_processed_images.html', images=images, top_images=top_images, group_name=group_name)
+    # Galeria paginada: o peso da página não cresce com o número de capturas do grupo
+    per_page = max(1, int(app.config['GALLERY_PAGE_SIZE']))
+    page = max(1, request.args.get('page', 1, type=int))
+    images, total_images, top_images = ranking_store.get_group_images_page(group_name, (page - 1) * per_page, per_page)
+    total_pages = max(1, (total_images + per_page - 1) // per_page)
+    return render_template('view_processed_images.html', images=images, top_images=top_images, group_name=group_name,
+                           page=page, total_pages=total_pages, total_images=total_images)
+
+# Rota para Miniaturas das Capturas (geradas sob demanda se ainda não existirem)
+@app.route('/thumbnail/<group_name>/<image_filename>')
+def thumbnail(group_name, image_filename):
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+
+    # Nome do grupo como um único componente de caminho (aceita espaços, como em 'grupo 1')
+    safe_group = os.path.basename(group_name) == group_name and group_name not in ('', '.', '..')
+    if (secure_filename_custom(image_filename) != image_filename or not safe_group
+            or not os.path.isdir(os.path.join('static', 'captures', group_name))):
+        abort(404)
+    capture_path = os.path.join('static', 'captures', group_name, image_filename)
+    if not os.path.exists(capture_path):
+        abort(404)
+    thumb_path = ensure_thumbnail(capture_path)
+    if thumb_path is None:
+        abort(404)
+    return send_from_directory(os.path.abspath(os.path.dirname(thumb_path)), image_filename, max_age=86400)
 
 # Rota para Deletar Imagem
 @app.route('/delete_image', methods=['POST'])
@@ -661,6 +1062,7 @@ def delete_image():
     if os.path.exists(image_path):
         try:
             os.remove(image_path)
+            delete_thumbnail(image_path)
             logging.info(f"Imagem {image_filename} deletada para o grupo {group_name}.")
         except Exception as e:
             logging.error(f"Erro ao deletar a imagem {image_filename}: {e}")
@@ -669,34 +1071,34 @@ def delete_image():
     else:
         logging.warning(f"Tentativa de deletar imagem inexistente: {image_filename} para o grupo {group_name}.")
 
-    with ranking_data_lock:
-        load_ranking_data()
-        group_entry = next((entry for entry in ranking_data if entry['group'] == group_name), None)
-        if group_entry and 'images' in group_entry:
-            group_entry['images'] = [img for img in group_entry['images'] if img['image_filename'] != image_filename]
-            sorted_images = sorted(
-                [img for img in group_entry['images'] if img.get('confidence') is not None],
-                key=lambda x: x['confidence'],
-                reverse=True
-            )
-            top_images = sorted_images[:3]
-            group_entry['top_images'] = top_images
-            group_entry['accuracy'] = sum(img['confidence'] for img in top_images) / len(top_images) if top_images else 0.0
-            save_ranking_data()
+    ranking_store.delete_image(group_name, image_filename)
 
     flash('Imagem deletada com sucesso.', 'success')
     return redirect(url_for('view_processed_images'))
 
+def leaderboard_response(template_name, **context):
+    """Renderiza uma página do ranking com ETag, respondendo 304 se o navegador já tem a versão atual."""
+    # O cabeçalho da página mostra o grupo/modelo da sessão, então eles entram na ETag
+    etag_source = f"{template_name}|{ranking_store.version}|{session.get('group_name', '')}|{session.get('model_name', '')}"
+    etag = hashlib.md5(etag_source.encode('utf-8')).hexdigest()
+
+    # Mensagens flash pendentes precisam ser exibidas, então a página é renderizada de novo
+    if '_flashes' not in session and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template(template_name, **context))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Rota para Exibir Ranking de Grupos
 @app.route('/podium_ranking')
 def podium_ranking():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
     
-    load_ranking_data()
-    sorted_ranking = sorted(ranking_data, key=lambda x: x['accuracy'], reverse=True)
-    top_three = sorted_ranking[:3]
-    return render_template('podium_ranking.html', top_three=top_three)
+    top_three = ranking_store.get_leaderboard()[:3]
+    return leaderboard_response('podium_ranking.html', top_three=top_three)
 
 
 
@@ -705,12 +1107,8 @@ def detailed_group_ranking():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
     
-    load_ranking_data()
-    # Ordenar os grupos por acurácia de forma decrescente
-    sorted_ranking = sorted(ranking_data, key=lambda x: x['accuracy'], reverse=True)
-    ranking_data_sorted = sorted_ranking
-    
-    return render_template('detailed_group_ranking.html', ranking_data=ranking_data_sorted)
+    # Grupos já ordenados por acurácia de forma decrescente
+    return leaderboard_response('detailed_group_ranking.html', ranking_data=ranking_store.get_leaderboard())
 
 
 
@@ -720,9 +1118,7 @@ def view_results():
     if not session.get('logged_in'):
         return redirect(url_for('login'))
 
-    load_ranking_data()
-    sorted_ranking = sorted(ranking_data, key=lambda x: x['accuracy'], reverse=True)
-    return render_template('view_results.html', ranking_data=sorted_ranking)
+    return leaderboard_response('view_results.html', ranking_data=ranking_store.get_leaderboard())
 
 # Rota para Configurações
 @app.route('/settings', methods=['GET', 'POST'])
@@ -734,25 +1130,32 @@ def settings_page():
     
     if request.method == 'POST':
         new_camera_url = request.form.get('camera_url', '').strip()
+        new_camera_mode = request.form.get('camera_mode', 'snapshot').strip()
         if not new_camera_url:
             flash('A URL da câmera não pode estar vazia.', 'error')
             return redirect(url_for('settings_page'))
+        if new_camera_mode not in CAMERA_MODES:
+            flash('Modo de câmera inválido.', 'error')
+            return redirect(url_for('settings_page'))
         
         # Atualizar as configurações
         current_settings['camera_url'] = new_camera_url
+        current_settings['camera_mode'] = new_camera_mode
         if Config.save_settings(current_settings):
             app.config['CAMERA_URL'] = new_camera_url
-            # Atualizar a URL da câmera nos processadores de grupo ativos
+            app.config['CAMERA_MODE'] = new_camera_mode
+            # Atualizar a URL da câmera nos processadores ativos dos grupos que usam a câmera padrão
             with group_processors_lock:
                 for processor in group_processors.values():
-                    processor.camera_url = new_camera_url
+                    processor.camera_url, processor.camera_mode, _ = group_camera(processor.group_name)
             flash('Configurações atualizadas com sucesso.', 'success')
         else:
             flash('Falha ao salvar as configurações.', 'error')
         
         return redirect(url_for('settings_page'))
     
-    return render_template('settings.html', camera_url=current_settings.get('camera_url', ''))
+    return render_template('settings.html', camera_url=current_settings.get('camera_url', ''),
+                           camera_mode=current_settings.get('camera_mode', 'snapshot'), camera_modes=CAMERA_MODES)
 
 
 @app.route('/about')
@@ -771,7 +1174,6 @@ if __name__ == '__main__':
     
     # Carregar dados iniciais
     load_groups()
-    load_ranking_data()
     
     # Iniciar o servidor Flask
     app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
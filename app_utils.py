@@ -1,5 +1,4 @@
 # app_utils.py
-import traceback
 import logging
 import os
 from werkzeug.utils import secure_filename
@@ -18,7 +17,6 @@ class TryExcept:
         try:
             return self.func(*args, **kwargs)
         except Exception as e:
-            logging.error(f"Ocorreu um erro na função '{self.func.__name__}': {e}")
-            traceback.print_exc()
+            logging.error(f"Ocorreu um erro na função '{self.func.__name__}': {e}", exc_info=True)
             return None
 
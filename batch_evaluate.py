@@ -0,0 +1,248 @@
+# batch_evaluate.py
+"""Avaliação offline do modelo de um ou mais grupos sobre uma pasta de imagens ou um vídeo.
+
+Usa o mesmo ModelCache, o mesmo perfil de inferência de settings.json e a mesma regra de
+ranking do processamento ao vivo (a detecção mais confiável de cada imagem). As imagens com
+detecção são gravadas em static/captures/<grupo>/ e registradas no ranking.db, de modo que
+repetir a avaliação com a mesma entrada sobrescreve os mesmos registros.
+
+As imagens são decodificadas em paralelo com antecedência (prefetch) e enviadas ao modelo
+em lotes, em uma única chamada por lote. O app pode continuar no ar: ele aplica ao seu
+índice do ranking as imagens gravadas aqui na próxima leitura (RankingStore.sync).
+
+    python batch_evaluate.py --group "grupo 1" --source pasta_de_imagens
+    python batch_evaluate.py --all-groups --source evento.mp4 --stride 5 --batch-size 16
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from config import Config
+from model_cache import ModelCache
+from inference_profile import InferenceProfile
+from ranking_store import open_ranking_store, best_detection
+from capture_writer import CaptureWriter
+from preprocessing import decode_frame, full_resolution_image, draw_detections
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def load_groups(path='groups.json'):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def resolve_model_path(model_path):
+    # groups.json pode ter sido gravado no Windows (separador '\\')
+    if not os.path.exists(model_path):
+        model_path = model_path.replace('\\', os.sep)
+    return model_path
+
+
+def load_image(path, decode_size):
+    """Lê o arquivo e decodifica já reduzido; o conteúdo original fica para salvar em resolução cheia."""
+    data = np.fromfile(path, dtype=np.uint8)
+    try:
+        img, scale = decode_frame(data, decode_size)
+    except ValueError:
+        print(f"Aviso: não foi possível decodificar {path}")
+        return None
+    # A extensão entra no nome para que foto.jpg e foto.png não gravem a mesma captura
+    stem, extension = os.path.splitext(os.path.basename(path))
+    return f"{stem}_{extension[1:]}", img, data, scale
+
+
+def prefetch_images(paths, decode_size, workers, depth):
+    """Decodifica as imagens em um pool de threads, mantendo no máximo `depth` em andamento."""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode') as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(load_image, path, decode_size))
+            if len(pending) >= depth:
+                item = pending.popleft().result()
+                if item is not None:
+                    yield item
+        while pending:
+            item = pending.popleft().result()
+            if item is not None:
+                yield item
+
+
+def prefetch_video(video_path, stride, depth):
+    """Lê o vídeo em uma thread separada e entrega um quadro a cada `stride`."""
+    frames = queue.Queue(maxsize=depth)
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+
+    def reader():
+        capture = cv2.VideoCapture(video_path)
+        index = 0
+        try:
+            while True:
+                # grab() avança sem decodificar; só os quadros usados passam por retrieve()
+                if not capture.grab():
+                    break
+                if index % stride == 0:
+                    ok, img = capture.retrieve()
+                    if ok:
+                        frames.put((f"{stem}_{index:06d}", img, None, 1))
+                index += 1
+        finally:
+            capture.release()
+            frames.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        yield item
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"deve ser pelo menos 1: {value}")
+    return number
+
+
+def iterate_source(source, args, decode_size):
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(source, f) for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS)
+        )[:args.limit]
+        return prefetch_images(paths, decode_size, args.workers, args.prefetch)
+    if source.lower().endswith(VIDEO_EXTENSIONS):
+        return prefetch_video(source, args.stride, args.prefetch)
+    raise ValueError(f"Fonte não suportada: {source}")
+
+
+def batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def evaluate_group(group_name, model_path, args, profile, ranking_store, capture_writer):
+    model = ModelCache.get_model(model_path)
+    if model is None:
+        print(f"Grupo '{group_name}': falha ao carregar o modelo {model_path}")
+        return None
+
+    capture_dir = os.path.join('static', 'captures', group_name)
+    os.makedirs(capture_dir, exist_ok=True)
+    decode_size = profile.input_size if args.reduced_decode else None
+
+    frames = saved = 0
+    inference_time = 0.0
+    start = time.perf_counter()
+    for batch in batches(iterate_source(args.source, args, decode_size), args.batch_size):
+        images = [img for _, img, _, _ in batch]
+        inference_start = time.perf_counter()
+        results = profile.run(model, images)  # Um único forward para o lote inteiro
+        inference_time += time.perf_counter() - inference_start
+        frames += len(batch)
+        if args.no_save:
+            continue
+
+        for (name, img, data, scale), detections in zip(batch, results.xyxy):
+            if hasattr(detections, 'cpu'):
+                detections = detections.cpu().numpy()
+            best = best_detection(detections, model.names)
+            if best is None:
+                continue
+            class_name, confidence = best
+            filename = f"eval_{name}.jpg"
+
+            def render(img=img, data=data, scale=scale, detections=detections):
+                full = full_resolution_image(data, img, scale)
+                return draw_detections(full, detections, model.names, scale=scale)
+
+            def on_written(filename, class_name=class_name, confidence=confidence):
+                ranking_store.add_image(group_name, filename, class_name, confidence)
+
+            # Com timeout longo a fila aplica contrapressão em vez de descartar capturas
+            if capture_writer.submit(render, os.path.join(capture_dir, filename), on_written, timeout=60):
+                saved += 1
+
+    capture_writer.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        'frames': frames,
+        'saved': saved,
+        'elapsed': elapsed,
+        'fps': frames / elapsed if elapsed else 0.0,
+        'inference_fps': frames / inference_time if inference_time else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avalia o modelo de um grupo sobre uma pasta de imagens ou um vídeo.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--group', action='append', help="Nome do grupo (pode ser repetido)")
+    target.add_argument('--all-groups', action='store_true', help="Avalia todos os grupos de groups.json")
+    parser.add_argument('--source', required=True, help="Pasta de imagens ou arquivo de vídeo")
+    parser.add_argument('--batch-size', type=positive_int, default=8)
+    parser.add_argument('--workers', type=positive_int, default=4, help="Threads de decodificação")
+    parser.add_argument('--prefetch', type=positive_int, default=32, help="Quadros decodificados com antecedência")
+    parser.add_argument('--stride', type=positive_int, default=1, help="Usa um a cada N quadros do vídeo")
+    parser.add_argument('--limit', type=int, default=None, help="Número máximo de imagens da pasta")
+    parser.add_argument('--no-save', action='store_true', help="Só mede o desempenho, sem gravar capturas nem ranking")
+    parser.add_argument('--full-decode', dest='reduced_decode', action='store_false',
+                        help="Decodifica as imagens em resolução cheia")
+    args = parser.parse_args()
+
+    yolov5_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5')
+    if yolov5_path not in sys.path:
+        sys.path.insert(0, yolov5_path)
+
+    settings = Config.load_settings()
+    profile = InferenceProfile.from_settings(settings)
+    profile.rebalance_threads(1, 1)
+    ModelCache.configure(max_bytes=settings.get('model_cache_max_mb', 1024) * 1024 * 1024, profile=profile)
+
+    groups = load_groups()
+    group_names = sorted(groups) if args.all_groups else args.group
+    unknown = [name for name in group_names if name not in groups]
+    if unknown:
+        parser.error(f"Grupos não encontrados em groups.json: {', '.join(unknown)}")
+
+    ranking_store = open_ranking_store(Config.RANKING_DB, 'ranking.json')
+    capture_writer = CaptureWriter(
+        queue_size=settings.get('capture_queue_size', 64),
+        jpeg_quality=settings.get('capture_jpeg_quality', 95)
+    )
+    capture_writer.start()
+
+    try:
+        for group_name in group_names:
+            model_path = resolve_model_path(groups[group_name].get('model', ''))
+            print(f"Avaliando o grupo '{group_name}' com {model_path}...")
+            summary = evaluate_group(group_name, model_path, args, profile, ranking_store, capture_writer)
+            if summary is None:
+                continue
+            accuracy = next((g['accuracy'] for g in ranking_store.get_ranking() if g['group'] == group_name), 0.0)
+            print(f"  {summary['frames']} quadros em {summary['elapsed']:.1f}s "
+                  f"({summary['fps']:.2f} FPS total, {summary['inference_fps']:.2f} FPS de inferência); "
+                  f"{summary['saved']} capturas; acurácia no ranking: {accuracy:.4f}")
+    finally:
+        ranking_store.close()
+
+
+if __name__ == '__main__':
+    main()
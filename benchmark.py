@@ -0,0 +1,480 @@
+# benchmark.py
+"""Benchmark ponta a ponta do pipeline captura → inferência → gravação, sem câmera nem GPU.
+
+Sobe um servidor HTTP local que imita a ESP32 (snapshot em /cam-hi.jpg e MJPEG em /stream)
+servindo JPEGs de uma pasta de fixtures (ou quadros sintéticos) e mede:
+
+- a latência p50/p95/p99 de cada etapa isolada (busca, decodificação, inferência, desenho,
+  codificação para o feed, gravação da captura e escrita no ranking);
+- o FPS e a latência ponta a ponta de 1..N GroupProcessors rodando ao mesmo tempo;
+- o custo de escrita e leitura do ranking conforme o número de imagens cresce;
+- a latência de /live_feed com N clientes simultâneos.
+
+Roda com um detector stub (padrão, sem pesos) ou com um model.pt real do YOLOv5. Tudo é
+executado em um diretório temporário, sem tocar no ranking.db nem em static/captures.
+
+    python benchmark.py --output benchmark_report.md
+    python benchmark.py --model "models/grupo 1/model.pt" --groups 1,3 --clients 1,8
+"""
+
+import os
+import sys
+import glob
+import time
+import pathlib
+import sqlite3
+import argparse
+import tempfile
+import threading
+import http.client
+import http.server
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from camera_source import SnapshotSource
+from preprocessing import decode_frame
+from frame_publisher import FramePublisher
+from capture_writer import CaptureWriter
+from ranking_store import RankingStore
+from rate_controller import RateController
+from onnx_backend import OnnxDetections
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentiles(samples):
+    """(p50, p95, p99) em milissegundos; None se não houver amostras."""
+    if not samples:
+        return None
+    values = np.percentile(np.asarray(samples) * 1000.0, [50, 95, 99])
+    return tuple(float(v) for v in values)
+
+
+def format_percentiles(samples):
+    values = percentiles(samples)
+    if values is None:
+        return '- | - | -'
+    return ' | '.join(f'{v:.2f}' for v in values)
+
+
+def load_fixtures(fixtures_dir, count=30, size=(800, 600)):
+    """JPEGs da pasta de fixtures ou, sem pasta, quadros sintéticos com um objeto em movimento."""
+    if fixtures_dir:
+        paths = sorted(glob.glob(os.path.join(fixtures_dir, '*.jpg')) + glob.glob(os.path.join(fixtures_dir, '*.jpeg')))
+        frames = [open(path, 'rb').read() for path in paths]
+        if not frames:
+            raise ValueError(f"Nenhum JPEG encontrado em {fixtures_dir}")
+        return frames
+
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (31, 31), 0)
+    frames = []
+    box_w, box_h = width // 3, height // 3
+    for i in range(count):
+        # Movimento grande o bastante para passar pelo pré-filtro de movimento (motion_gate)
+        img = background.copy()
+        x = (i * 61) % (width - box_w)
+        cv2.rectangle(img, (x, box_h), (x + box_w, 2 * box_h), (245, 245, 245), -1)
+        frames.append(cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])[1].tobytes())
+    return frames
+
+
+class FakeCamera:
+    """Servidor HTTP local no lugar da ESP32: /cam-hi.jpg (keep-alive) e /stream (MJPEG)."""
+
+    def __init__(self, frames, fps=25.0):
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.index = 0
+        self.lock = threading.Lock()
+        camera = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.path.startswith('/stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                    self.end_headers()
+                    try:
+                        while not camera.stopped:
+                            jpeg = camera.next_frame()
+                            self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' +
+                                             str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                            time.sleep(camera.interval)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                    self.close_connection = True
+                    return
+                jpeg = camera.next_frame()
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def log_message(self, *args):
+                pass
+
+        self.stopped = False
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def next_frame(self):
+        with self.lock:
+            jpeg = self.frames[self.index % len(self.frames)]
+            self.index += 1
+            return jpeg
+
+    def url(self, camera_mode):
+        path = '/stream' if camera_mode == 'mjpeg' else '/cam-hi.jpg'
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubDetector:
+    """Detector falso com a mesma interface do modelo (names, chamada com size, xyxy e render).
+
+    Gera uma caixa determinística por imagem; `cost_ms` simula o tempo de um detector real.
+    """
+
+    names = ['objeto']
+
+    def __init__(self, cost_ms=0.0):
+        self.cost = cost_ms / 1000.0
+
+    def eval(self):
+        return self
+
+    def __call__(self, img, size=None):
+        if isinstance(img, (list, tuple)):
+            results = [self(im, size) for im in img]
+            return OnnxDetections([r.ims[0] for r in results], [r.xyxy[0] for r in results], self.names)
+        small = cv2.resize(img, (64, 48), interpolation=cv2.INTER_AREA)
+        height, width = img.shape[:2]
+        confidence = 0.5 + float(small.mean()) / 510.0
+        detections = np.array([[width * 0.25, height * 0.25, width * 0.75, height * 0.75, confidence, 0]],
+                              dtype=np.float32)
+        if self.cost:
+            time.sleep(self.cost)
+        return OnnxDetections([img], [detections], self.names)
+
+
+def import_app(workdir):
+    """Importa o app dentro do diretório temporário (ranking.db, capturas e app.log ficam lá)."""
+    os.environ['RANKING_DB'] = os.path.join(workdir, 'ranking.db')
+    yolov5_dir = os.path.join(REPO_DIR, 'yolov5')
+    if os.path.isdir(yolov5_dir):
+        os.symlink(yolov5_dir, os.path.join(workdir, 'yolov5'))  # torch.hub.load usa 'yolov5' relativo
+    os.chdir(workdir)
+    posix_path = pathlib.PosixPath
+    import app as app_module
+    if os.name != 'nt':
+        # O app troca PosixPath por WindowsPath para modelos salvos no Windows; no Linux isso
+        # impede criar qualquer Path, então o benchmark restaura a classe original
+        pathlib.PosixPath = posix_path
+    return app_module
+
+
+def make_processor_class(app_module, model_factory, target_fps):
+    class BenchmarkProcessor(app_module.GroupProcessor):
+        """GroupProcessor que registra a latência ponta a ponta de cada quadro concluído."""
+
+        def __init__(self, group_name):
+            self.latencies = []
+            super().__init__(group_name)
+            # Sem espectadores o controlador reduziria o ritmo; no benchmark a meta é a taxa máxima
+            self.rate_controller = RateController(target_fps=target_fps, idle_fps=target_fps)
+
+        def load_model(self):
+            if model_factory is None:
+                return super().load_model()
+            future = Future()
+            future.set_result(model_factory())
+            return future
+
+        def process_grabbed_frame(self, grabbed):
+            super().process_grabbed_frame(grabbed)
+            self.latencies.append(time.time() - grabbed.timestamp)
+
+    return BenchmarkProcessor
+
+
+def start_processors(app_module, processor_class, count, model_path):
+    processors = []
+    for i in range(count):
+        group_name = f'benchmark_{i}'
+        app_module.groups[group_name] = {'model': model_path or ''}
+        processor = processor_class(group_name)
+        with app_module.group_processors_lock:
+            app_module.group_processors[group_name] = processor
+        processor.start_processing()
+        processors.append(processor)
+    app_module.rebalance_inference_threads()
+    return processors
+
+
+def stop_processors(app_module, processors):
+    for processor in processors:
+        processor.stop_processing()
+        with app_module.group_processors_lock:
+            app_module.group_processors.pop(processor.group_name, None)
+    app_module.rebalance_inference_threads()
+
+
+def wait_until_ready(processors, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(p.model_loaded for p in processors):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def bench_stages(app_module, camera, model, frames, args, workdir):
+    """Mede cada etapa isoladamente, com os mesmos componentes usados pelo app."""
+    iterations = args.stage_iterations
+    profile = app_module.inference_profile
+    decode_size = profile.input_size if app_module.settings.get('reduced_decode', True) else None
+    timings = {name: [] for name in ('busca', 'decodificação', 'decodificação (cheia)', 'inferência',
+                                     'desenho', 'codificação do feed', 'gravação da captura', 'escrita no ranking')}
+
+    source = SnapshotSource(camera.url('snapshot'))
+    publisher = FramePublisher()
+    writer = CaptureWriter(queue_size=4)
+    writer.start()
+    store = RankingStore(os.path.join(workdir, 'stages.db'))
+    store.open()
+    capture_dir = os.path.join(workdir, 'stage_captures')
+    os.makedirs(capture_dir, exist_ok=True)
+
+    def timed(name, fn, *fn_args):
+        start = time.perf_counter()
+        result = fn(*fn_args)
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    try:
+        for i in range(iterations):
+            timed('busca', source.read)
+            data = np.frombuffer(frames[i % len(frames)], dtype=np.uint8)
+            img, _ = timed('decodificação', decode_frame, data, decode_size)
+            timed('decodificação (cheia)', decode_frame, data, None)
+            results = timed('inferência', profile.run, model, img)
+            rendered = timed('desenho', lambda: np.squeeze(results.render()))
+            timed('codificação do feed', publisher.publish, rendered)
+            path = os.path.join(capture_dir, f'capture_{i}.jpg')
+            timed('gravação da captura', lambda: (writer.submit(rendered, path, timeout=10), writer.flush()))
+            timed('escrita no ranking', store.add_image, 'benchmark', f'capture_{i}.jpg', 'objeto', 0.5 + i * 1e-6)
+    finally:
+        source.close()
+        store.close()
+    return timings
+
+
+def bench_pipeline(app_module, processor_class, model_path, count, args):
+    processors = start_processors(app_module, processor_class, count, model_path)
+    try:
+        if not wait_until_ready(processors):
+            raise RuntimeError("Modelos não carregaram a tempo")
+        time.sleep(args.warmup)
+        for processor in processors:
+            processor.latencies = []
+        captures_before = app_module.capture_writer.stats()['written']
+        start = time.time()
+        time.sleep(args.duration)
+        elapsed = time.time() - start
+        latencies = [list(p.latencies) for p in processors]
+        gate = [p.motion_gate.stats() for p in processors]
+        scheduler = app_module.inference_scheduler.stats()
+        captures = app_module.capture_writer.stats()['written'] - captures_before
+    finally:
+        stop_processors(app_module, processors)
+    return {
+        'groups': count,
+        'fps': [len(l) / elapsed for l in latencies],
+        'latencies': [x for l in latencies for x in l],
+        'dropped': sum(scheduler.get(p.group_name, {}).get('dropped', 0) for p in processors),
+        'captures': captures,
+        'skip_rate': np.mean([g['skip_rate'] for g in gate]),
+    }
+
+
+def bench_ranking(workdir, sizes, samples=200):
+    """Custo do ranking conforme o grupo cresce: abertura (índice), inserção e leitura paginada."""
+    rows = []
+    db_path = os.path.join(workdir, 'ranking_growth.db')
+    store = RankingStore(db_path)
+    store.open()
+    store.close()
+    filled = 0
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        # Preenche em lote direto no SQLite; só as amostras medidas passam pelo RankingStore
+        with sqlite3.connect(db_path) as connection:
+            connection.execute('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', ('benchmark',))
+            connection.executemany(
+                'INSERT INTO images (group_name, image_filename, class, confidence) VALUES (?, ?, ?, ?)',
+                (('benchmark', f'fill_{n}.jpg', 'objeto', float(c))
+                 for n, c in zip(range(filled, size), rng.random(size - filled)))
+            )
+        filled = size
+
+        store = RankingStore(db_path)
+        start = time.perf_counter()
+        store.open()
+        open_time = time.perf_counter() - start
+        inserts, pages = [], []
+        for n in range(samples):
+            start = time.perf_counter()
+            store.add_image('benchmark', f'sample_{size}_{n}.jpg', 'objeto', float(rng.random()))
+            inserts.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.get_leaderboard()
+            store.get_group_images_page('benchmark', 0, 24)
+            pages.append(time.perf_counter() - start)
+        filled += samples
+        store.close()
+        rows.append((size, open_time, inserts, pages))
+    return rows
+
+
+def bench_live_feed(app_module, processor_class, model_path, client_counts, args):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    processors = start_processors(app_module, processor_class, 1, model_path)
+    serializer = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    cookie_name = app_module.app.config.get('SESSION_COOKIE_NAME', 'session')
+    cookie = f"{cookie_name}={serializer.dumps({'logged_in': True, 'group_name': processors[0].group_name})}"
+    rows = []
+    try:
+        if not wait_until_ready(processors):
+            raise RuntimeError("Modelo não carregou a tempo")
+        time.sleep(args.warmup)
+        for clients in client_counts:
+            latencies = [[] for _ in range(clients)]
+            deadline = time.perf_counter() + args.duration
+
+            def client(samples):
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    connection.request('GET', '/live_feed', headers={'Cookie': cookie})
+                    connection.getresponse().read()
+                    samples.append(time.perf_counter() - start)
+                connection.close()
+
+            threads = [threading.Thread(target=client, args=(samples,)) for samples in latencies]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            merged = [x for l in latencies for x in l]
+            rows.append((clients, len(merged) / args.duration, merged))
+    finally:
+        stop_processors(app_module, processors)
+        server.shutdown()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline captura → inferência → gravação.")
+    parser.add_argument('--model', default=None, help="model.pt do YOLOv5; sem ele usa o detector stub")
+    parser.add_argument('--stub-ms', type=float, default=20.0, help="Tempo simulado por inferência do stub")
+    parser.add_argument('--fixtures', default=None, help="Pasta com JPEGs servidos pela câmera falsa")
+    parser.add_argument('--camera-mode', choices=('snapshot', 'mjpeg'), default='snapshot')
+    parser.add_argument('--camera-fps', type=float, default=25.0, help="FPS do stream MJPEG falso")
+    parser.add_argument('--groups', default='1,2,4', help="Quantidades de grupos simultâneos")
+    parser.add_argument('--clients', default='1,4,16', help="Clientes simultâneos em /live_feed")
+    parser.add_argument('--ranking-sizes', default='1000,10000,50000')
+    parser.add_argument('--target-fps', type=float, default=30.0)
+    parser.add_argument('--duration', type=float, default=10.0, help="Segundos medidos em cada cenário")
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--stage-iterations', type=int, default=50)
+    parser.add_argument('--output', default='benchmark_report.md')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    model_path = os.path.abspath(args.model) if args.model else None
+    workdir = tempfile.mkdtemp(prefix='benchmark_')
+    frames = load_fixtures(args.fixtures)
+    camera = FakeCamera(frames, fps=args.camera_fps).start()
+
+    app_module = import_app(workdir)
+    app_module.app.config['CAMERA_URL'] = camera.url(args.camera_mode)
+    app_module.app.config['CAMERA_MODE'] = args.camera_mode
+    model_factory = None if model_path else (lambda: StubDetector(args.stub_ms))
+    processor_class = make_processor_class(app_module, model_factory, args.target_fps)
+
+    if model_path:
+        model = app_module.ModelCache.get_model(model_path)
+        if model is None:
+            parser.error(f"Falha ao carregar o modelo {model_path}")
+    else:
+        model = StubDetector(args.stub_ms)
+
+    lines = [
+        '# Benchmark do pipeline',
+        '',
+        f"- Detector: {'`' + args.model + '`' if args.model else f'stub ({args.stub_ms:.0f} ms por quadro)'}",
+        f"- Câmera falsa: {len(frames)} quadro(s) em modo {args.camera_mode}",
+        f"- Perfil: {app_module.inference_profile.backend}/{app_module.inference_profile.mode}, "
+        f"entrada {app_module.inference_profile.input_size}, {os.cpu_count()} CPU(s)",
+        '',
+    ]
+    try:
+        print("Medindo as etapas isoladas...")
+        timings = bench_stages(app_module, camera, model, frames, args, workdir)
+        lines += ['## Etapas isoladas (ms)', '', '| Etapa | p50 | p95 | p99 |', '|-------|-----|-----|-----|']
+        lines += [f'| {name} | {format_percentiles(samples)} |' for name, samples in timings.items()]
+
+        lines += ['', '## Pipeline ao vivo', '',
+                  '| Grupos | FPS por grupo (média) | FPS total | Latência p50 | p95 | p99 | Descartes | Capturas | Inferências puladas |',
+                  '|--------|-----------------------|-----------|--------------|-----|-----|-----------|----------|---------------------|']
+        for count in (int(n) for n in args.groups.split(',')):
+            print(f"Medindo o pipeline com {count} grupo(s)...")
+            result = bench_pipeline(app_module, processor_class, model_path, count, args)
+            lines.append(f"| {count} | {np.mean(result['fps']):.2f} | {sum(result['fps']):.2f} | "
+                         f"{format_percentiles(result['latencies'])} | {result['dropped']} | {result['captures']} | "
+                         f"{result['skip_rate']:.0%} |")
+
+        print("Medindo o ranking...")
+        lines += ['', '## Ranking conforme o número de imagens (ms)', '',
+                  '| Imagens | Abertura | Inserção p50 | p95 | p99 | Leaderboard + página p50 | p95 | p99 |',
+                  '|---------|----------|--------------|-----|-----|--------------------------|-----|-----|']
+        for size, open_time, inserts, pages in bench_ranking(workdir, [int(n) for n in args.ranking_sizes.split(',')]):
+            lines.append(f'| {size} | {open_time * 1000:.1f} | {format_percentiles(inserts)} | {format_percentiles(pages)} |')
+
+        print("Medindo /live_feed...")
+        lines += ['', '## /live_feed com clientes simultâneos (ms)', '',
+                  '| Clientes | Requisições/s | p50 | p95 | p99 |', '|----------|---------------|-----|-----|-----|']
+        for clients, rate, samples in bench_live_feed(app_module, processor_class, model_path,
+                                                      [int(n) for n in args.clients.split(',')], args):
+            lines.append(f'| {clients} | {rate:.1f} | {format_percentiles(samples)} |')
+    finally:
+        camera.stop()
+
+    with open(output_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# camera_loop.py
+
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_source import create_async_camera_source
+from metrics import registry
+
+
+class CameraLoop:
+    """Event loop asyncio em uma única thread que busca os quadros de todas as câmeras.
+
+    Cada câmera é uma tarefa do loop: uma câmera lenta ou fora do ar só ocupa um timeout e
+    um backoff, sem prender uma thread. A decodificação dos JPEGs, que usa CPU, roda em um
+    pool pequeno de threads (`decode_threads`) e o quadro decodificado é publicado no
+    FrameGrabber da câmera, de onde os laços de inferência o leem como antes.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, decode_threads=2):
+        self.loop = asyncio.new_event_loop()
+        self.decode_executor = ThreadPoolExecutor(max_workers=max(1, int(decode_threads)),
+                                                  thread_name_prefix='camera-decode')
+        self.tasks = {}  # grabber -> asyncio.Task (acessado só pela thread do loop)
+        self.thread = threading.Thread(target=self._run, name='camera-loop', daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def instance(cls, decode_threads=2):
+        """Loop compartilhado do processo, criado no primeiro uso."""
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.thread.is_alive():
+                cls._instance = cls(decode_threads)
+                logging.info(f"Loop de câmeras iniciado ({decode_threads} thread(s) de decodificação).")
+            return cls._instance
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def add(self, grabber):
+        self.loop.call_soon_threadsafe(self._start_task, grabber)
+
+    def remove(self, grabber):
+        self.loop.call_soon_threadsafe(self._cancel_task, grabber)
+
+    def _start_task(self, grabber):
+        if grabber not in self.tasks:
+            task = self.tasks[grabber] = self.loop.create_task(self._camera_task(grabber))
+            task.add_done_callback(lambda _: self.tasks.pop(grabber, None))
+
+    def _cancel_task(self, grabber):
+        task = self.tasks.get(grabber)
+        if task is not None:
+            task.cancel()
+
+    async def _camera_task(self, grabber):
+        source = create_async_camera_source(grabber.camera_url, grabber.camera_mode)
+        try:
+            while not grabber.stop_event.is_set():
+                try:
+                    start = time.perf_counter()
+                    data = await asyncio.wait_for(source.read(), grabber.timeout)
+                    registry.observe('camera_stage_seconds', time.perf_counter() - start,
+                                     camera=grabber.camera_url, stage='fetch')
+                    await self.loop.run_in_executor(self.decode_executor, grabber.publish, data)
+                    grabber.fetch_succeeded()
+                except Exception as e:
+                    source.close()  # Conexão em estado desconhecido depois de timeout ou erro
+                    await asyncio.sleep(grabber.fetch_failed(e))
+        finally:
+            source.close()
@@ -0,0 +1,333 @@
+# camera_source.py
+
+import ssl
+import asyncio
+import http.client
+import logging
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# Modos aceitos em settings.json ('camera_mode')
+CAMERA_MODES = ('snapshot', 'mjpeg')
+
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+
+def _open_connection(camera_url, timeout):
+    parts = urlsplit(camera_url)
+    connection_cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_cls(parts.hostname, parts.port, timeout=timeout)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return connection, path
+
+
+class SnapshotSource:
+    """Busca JPEGs únicos (ex.: /cam-hi.jpg) reaproveitando a mesma conexão HTTP keep-alive.
+
+    Com Content-Length, o corpo é lido direto em um buffer pré-alocado (readinto), sem
+    objetos bytes intermediários; o array retornado é uma view válida até a próxima leitura.
+    """
+
+    def __init__(self, camera_url, timeout=5, buffer_size=1 << 20):
+        self.camera_url = camera_url
+        self.timeout = timeout
+        self.connection = None
+        self.path = None
+        self.buffer = bytearray(buffer_size)
+
+    def _request(self):
+        if self.connection is None:
+            self.connection, self.path = _open_connection(self.camera_url, self.timeout)
+        self.connection.request('GET', self.path, headers={'Connection': 'keep-alive'})
+        response = self.connection.getresponse()
+        length = response.length
+        if length is None:
+            data = np.frombuffer(response.read(), dtype=np.uint8)
+        else:
+            if length > len(self.buffer):
+                self.buffer = bytearray(length)
+            view = memoryview(self.buffer)[:length]
+            received = 0
+            while received < length:
+                count = response.readinto(view[received:])
+                if not count:
+                    raise http.client.IncompleteRead(bytes(view[:received]), length - received)
+                received += count
+            data = np.frombuffer(self.buffer, dtype=np.uint8, count=length)
+        if response.status != 200:
+            raise IOError(f"Câmera respondeu com status {response.status}")
+        if response.will_close:
+            self.close()
+        return data
+
+    def read(self):
+        """Retorna os bytes do JPEG como array uint8 (sem cópia)."""
+        try:
+            return self._request()
+        except (http.client.HTTPException, ConnectionError):
+            # A câmera pode ter fechado a conexão ociosa: tenta uma vez com conexão nova
+            self.close()
+            return self._request()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class MjpegSource:
+    """Lê um stream multipart/x-mixed-replace e separa os JPEGs pelos marcadores SOI/EOI."""
+
+    def __init__(self, camera_url, timeout=5, buffer_size=1 << 20):
+        self.camera_url = camera_url
+        self.timeout = timeout
+        self.connection = None
+        self.response = None
+        # Buffer reaproveitado entre quadros; cresce apenas se um quadro não couber
+        self.buffer = bytearray(buffer_size)
+        self.filled = 0
+        self.frame_end = 0
+
+    def _connect(self):
+        self.connection, path = _open_connection(self.camera_url, self.timeout)
+        self.connection.request('GET', path)
+        self.response = self.connection.getresponse()
+        if self.response.status != 200:
+            status = self.response.status
+            self.close()
+            raise IOError(f"Câmera respondeu com status {status}")
+        self.filled = 0
+        self.frame_end = 0
+        logging.info(f"Stream MJPEG conectado em {self.camera_url}.")
+
+    def _fill(self, chunk_size=64 * 1024):
+        if self.filled == len(self.buffer):
+            # Buffer novo em vez de crescer no lugar: o quadro anterior ainda pode ser uma view
+            # (np.frombuffer) deste buffer, e um bytearray com views exportadas não pode mudar de tamanho
+            buffer = bytearray(2 * len(self.buffer))
+            buffer[:self.filled] = self.buffer[:self.filled]
+            self.buffer = buffer
+        # read1 retorna o que já chegou; readinto bloquearia até encher o buffer inteiro,
+        # atrasando os quadros em rajadas de ~1 s
+        chunk = self.response.read1(min(chunk_size, len(self.buffer) - self.filled))
+        if not chunk:
+            raise ConnectionError("Stream MJPEG encerrado pela câmera")
+        self.buffer[self.filled:self.filled + len(chunk)] = chunk
+        self.filled += len(chunk)
+
+    def read(self):
+        """Retorna o próximo JPEG como view uint8 do buffer interno, válida até a próxima leitura."""
+        if self.response is None:
+            self._connect()
+        try:
+            # Descarta o quadro entregue na chamada anterior
+            if self.frame_end:
+                remaining = self.filled - self.frame_end
+                self.buffer[:remaining] = self.buffer[self.frame_end:self.filled]
+                self.filled = remaining
+                self.frame_end = 0
+
+            start = self.buffer.find(JPEG_SOI, 0, self.filled)
+            while start < 0:
+                # Mantém só o último byte, que pode ser a metade de um marcador
+                if self.filled:
+                    self.buffer[0] = self.buffer[self.filled - 1]
+                    self.filled = 1
+                self._fill()
+                start = self.buffer.find(JPEG_SOI, 0, self.filled)
+
+            end = self.buffer.find(JPEG_EOI, start + 2, self.filled)
+            while end < 0:
+                searched = max(self.filled - 1, start + 2)
+                self._fill()
+                end = self.buffer.find(JPEG_EOI, searched, self.filled)
+
+            self.frame_end = end + 2
+            return np.frombuffer(self.buffer, dtype=np.uint8, count=self.frame_end - start, offset=start)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def create_camera_source(camera_url, camera_mode='snapshot', timeout=5):
+    if camera_mode == 'mjpeg':
+        return MjpegSource(camera_url, timeout=timeout)
+    if camera_mode != 'snapshot':
+        logging.warning(f"Modo de câmera desconhecido '{camera_mode}'. Usando 'snapshot'.")
+    return SnapshotSource(camera_url, timeout=timeout)
+
+
+# Fontes assíncronas: as mesmas leituras, para o event loop compartilhado de camera_loop.py.
+# O timeout de cada leitura é aplicado por quem chama (asyncio.wait_for).
+
+async def _open_stream(camera_url):
+    parts = urlsplit(camera_url)
+    https = parts.scheme == 'https'
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or (443 if https else 80),
+        ssl=ssl.create_default_context() if https else None
+    )
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    request = f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n".encode('latin-1')
+    return reader, writer, request
+
+
+async def _read_response_head(reader):
+    """Lê a linha de status e os cabeçalhos; retorna (status, cabeçalhos em minúsculas)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Conexão encerrada pela câmera")
+    try:
+        status = int(status_line.split(None, 2)[1])
+    except (IndexError, ValueError):
+        raise http.client.BadStatusLine(status_line.decode('latin-1', 'replace').strip())
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return status, headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+class AsyncSnapshotSource:
+    """Versão assíncrona de SnapshotSource: JPEGs únicos pela mesma conexão keep-alive."""
+
+    def __init__(self, camera_url):
+        self.camera_url = camera_url
+        self.reader = None
+        self.writer = None
+        self.request = None
+
+    async def _request(self):
+        if self.writer is None:
+            self.reader, self.writer, self.request = await _open_stream(self.camera_url)
+        self.writer.write(self.request)
+        await self.writer.drain()
+        status, headers = await _read_response_head(self.reader)
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            body = b''.join(chunks)
+            will_close = headers.get('connection', '').lower() == 'close'
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+            will_close = headers.get('connection', '').lower() == 'close'
+        else:
+            body = await self.reader.read()  # Sem tamanho: o corpo vai até a câmera fechar a conexão
+            will_close = True
+        if status != 200:
+            self.close()
+            raise IOError(f"Câmera respondeu com status {status}")
+        if will_close:
+            self.close()
+        return np.frombuffer(body, dtype=np.uint8)
+
+    async def read(self):
+        """Retorna os bytes do JPEG como array uint8."""
+        reused = self.writer is not None
+        try:
+            return await self._request()
+        except (http.client.HTTPException, ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+            # A câmera pode ter fechado a conexão ociosa: tenta uma vez com conexão nova
+            return await self._request()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class AsyncMjpegSource:
+    """Versão assíncrona de MjpegSource: separa os JPEGs do stream pelos marcadores SOI/EOI."""
+
+    def __init__(self, camera_url, chunk_size=64 * 1024):
+        self.camera_url = camera_url
+        self.chunk_size = chunk_size
+        self.reader = None
+        self.writer = None
+        self.buffer = bytearray()
+        self.frame_end = 0
+
+    async def _connect(self):
+        self.reader, self.writer, request = await _open_stream(self.camera_url)
+        self.writer.write(request)
+        await self.writer.drain()
+        status, _ = await _read_response_head(self.reader)
+        if status != 200:
+            self.close()
+            raise IOError(f"Câmera respondeu com status {status}")
+        self.buffer.clear()
+        self.frame_end = 0
+        logging.info(f"Stream MJPEG conectado em {self.camera_url}.")
+
+    async def _fill(self):
+        chunk = await self.reader.read(self.chunk_size)
+        if not chunk:
+            raise ConnectionError("Stream MJPEG encerrado pela câmera")
+        self.buffer += chunk
+
+    async def read(self):
+        """Retorna o próximo JPEG como array uint8 (cópia, pois o buffer é reaproveitado)."""
+        if self.writer is None:
+            await self._connect()
+        try:
+            # Descarta o quadro entregue na chamada anterior
+            del self.buffer[:self.frame_end]
+            self.frame_end = 0
+
+            start = self.buffer.find(JPEG_SOI)
+            while start < 0:
+                # Mantém só o último byte, que pode ser a metade de um marcador
+                del self.buffer[:-1]
+                await self._fill()
+                start = self.buffer.find(JPEG_SOI)
+
+            end = self.buffer.find(JPEG_EOI, start + 2)
+            while end < 0:
+                searched = max(len(self.buffer) - 1, start + 2)
+                await self._fill()
+                end = self.buffer.find(JPEG_EOI, searched)
+
+            self.frame_end = end + 2
+            return np.frombuffer(bytes(self.buffer[start:self.frame_end]), dtype=np.uint8)
+        except BaseException:
+            # Inclui cancelamento e timeout: o stream ficou no meio de um quadro
+            self.close()
+            raise
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def create_async_camera_source(camera_url, camera_mode='snapshot'):
+    if camera_mode == 'mjpeg':
+        return AsyncMjpegSource(camera_url)
+    if camera_mode != 'snapshot':
+        logging.warning(f"Modo de câmera desconhecido '{camera_mode}'. Usando 'snapshot'.")
+    return AsyncSnapshotSource(camera_url)
@@ -0,0 +1,113 @@
+# capture_writer.py
+
+import os
+import queue
+import threading
+import logging
+
+import cv2
+
+from thumbnails import write_thumbnail
+from metrics import registry
+
+
+class CaptureWriter:
+    """Grava as capturas em segundo plano, fora da thread de inferência e dos locks globais.
+
+    Cada job codifica o quadro em JPEG, grava em um arquivo temporário com fsync e o renomeia
+    para o destino final; só então `on_written(filename)` é chamado para atualizar o ranking.
+    A miniatura da galeria é gerada no mesmo job, a partir do quadro ainda em memória.
+    A fila é limitada: quando cheia, novas capturas são descartadas e contabilizadas.
+    """
+
+    def __init__(self, queue_size=64, jpeg_quality=95, num_workers=1):
+        self.jpeg_quality = jpeg_quality
+        self.num_workers = max(1, int(num_workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.lock = threading.Lock()
+        self.workers = []
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        """Inicia os workers; chamadas repetidas não têm efeito."""
+        with self.lock:
+            if self.workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"capture-writer-{i}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+        logging.info(f"Gravador de capturas iniciado com {self.num_workers} worker(s).")
+
+    def submit(self, frame, filepath, on_written=None, timeout=None, group_name=''):
+        """Enfileira a gravação; retorna False se a fila estiver cheia.
+
+        Com `timeout`, aguarda até esse tempo por espaço na fila antes de desistir.
+        `frame` pode ser uma função sem argumentos que produz o quadro; ela é chamada na
+        thread de gravação (ex.: decodificar o JPEG original em resolução cheia).
+        `group_name` rotula o tempo de gravação nas métricas.
+        """
+        job = (frame, filepath, on_written, group_name)
+        try:
+            if timeout is None:
+                self.queue.put_nowait(job)
+            else:
+                self.queue.put(job, timeout=timeout)
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            logging.warning(f"Fila de gravação cheia; captura descartada: {filepath}", extra={'group': group_name})
+            return False
+
+    def _write(self, frame, filepath):
+        if callable(frame):
+            frame = frame()
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ret:
+            raise ValueError("Falha ao codificar a imagem em JPEG")
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        try:
+            write_thumbnail(frame, filepath)
+        except Exception as e:
+            # Sem miniatura a galeria gera uma sob demanda; a captura em si está gravada
+            logging.warning(f"Erro ao gerar miniatura de {filepath}: {e}")
+
+    def _worker_loop(self):
+        while True:
+            frame, filepath, on_written, group_name = self.queue.get()
+            try:
+                with registry.time('pipeline_stage_seconds', group=group_name, stage='capture_write'):
+                    self._write(frame, filepath)
+                with self.lock:
+                    self.written += 1
+                if on_written is not None:
+                    on_written(os.path.basename(filepath))
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                logging.error(f"Erro ao gravar a captura {filepath}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Bloqueia até todas as capturas enfileiradas serem gravadas."""
+        self.queue.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'jpeg_quality': self.jpeg_quality,
+            }
@@ -8,6 +8,7 @@ class Config:
     LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ['true', '1', 't']
     SETTINGS_FILE = 'settings.json'
+    RANKING_DB = os.environ.get('RANKING_DB', 'ranking.db')
     
     @classmethod
     def load_settings(cls):
@@ -25,7 +26,40 @@ class Config:
         else:
             # Retorna configurações padrão se o arquivo não existir
             return {
-                "camera_url": "http://192.168.1.7/cam-hi.jpg"
+                "camera_url": "http://192.168.1.7/cam-hi.jpg",
+                "camera_mode": "snapshot",
+                "inference_workers": 1,
+                "inference_queue_size": 1,
+                "live_stream_max_fps": 10,
+                "capture_queue_size": 64,
+                "capture_jpeg_quality": 95,
+                "gallery_page_size": 24,
+                "model_cache_max_mb": 1024,
+                "inference_mode": "fp32",
+                "inference_input_size": 640,
+                "inference_threads": None,
+                "inference_backend": "torch",
+                "motion_threshold": 2.0,
+                "motion_max_skip_seconds": 5.0,
+                "live_target_fps": 10,
+                "live_min_fps": 1,
+                "live_idle_fps": 2,
+                "live_latency_budget": 0.5,
+                "live_cpu_budget": 0.8,
+                "reduced_decode": True,
+                "metrics_token": None,
+                "log_max_mb": 10,
+                "log_backup_count": 5,
+                "log_dedup_interval": 60,
+                "processing_mode": "thread",
+                "worker_frame_slot_mb": 1,
+                "pool_workers": None,
+                "pool_cores_per_worker": 1,
+                "pool_groups_per_worker": 2,
+                "camera_fetcher": "async",
+                "camera_timeout": 5,
+                "camera_max_backoff": 30,
+                "camera_decode_threads": 2
             }
     
     @classmethod
@@ -0,0 +1,191 @@
+# frame_grabber.py
+
+import threading
+import time
+import hashlib
+import logging
+from collections import namedtuple
+
+from camera_source import create_camera_source
+from camera_loop import CameraLoop
+from preprocessing import decode_frame
+from metrics import registry
+
+# Quadro publicado pelo grabber: número de sequência, instante da captura, imagem decodificada
+# e hash dos bytes JPEG (quadros idênticos têm o mesmo hash e não são decodificados de novo).
+# `image` pode estar reduzida (1/2, 1/4, 1/8); `jpeg` guarda o original comprimido para que a
+# resolução cheia seja decodificada só quando uma captura for salva, e `scale` é o fator de volta.
+GrabbedFrame = namedtuple('GrabbedFrame', ['seq', 'timestamp', 'image', 'raw_hash', 'jpeg', 'scale'])
+
+
+class FrameGrabber:
+    """Busca os quadros de uma URL de câmera e publica o último para todos os inscritos.
+
+    Com `fetcher='async'` (padrão) todas as câmeras são lidas no mesmo event loop (CameraLoop);
+    com `fetcher='thread'` cada câmera tem a sua thread bloqueante. Falhas seguidas aumentam o
+    intervalo até a próxima tentativa (backoff exponencial de `retry_interval` até `max_backoff`).
+    """
+
+    _grabbers = {}
+    _grabbers_lock = threading.Lock()
+    decode_size = None  # Lado mínimo da imagem decodificada (tamanho de entrada do modelo); None = resolução cheia
+    fetcher = 'async'
+    max_backoff = 30.0
+    decode_threads = 2
+
+    def __init__(self, camera_url, camera_mode='snapshot', timeout=5, retry_interval=1.0):
+        self.camera_url = camera_url
+        self.camera_mode = camera_mode
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.subscribers = 0
+        self.latest = None
+        self.seq = 0
+        self.decoded = 0
+        self.decode_skips = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.backoff = 0.0
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    @classmethod
+    def configure(cls, decode_size=None, fetcher='async', max_backoff=30.0, decode_threads=2):
+        cls.decode_size = decode_size
+        if fetcher not in ('async', 'thread'):
+            logging.warning(f"Modo de busca de câmera desconhecido '{fetcher}'. Usando 'async'.")
+            fetcher = 'async'
+        cls.fetcher = fetcher
+        cls.max_backoff = max_backoff
+        cls.decode_threads = decode_threads
+
+    @classmethod
+    def acquire(cls, camera_url, camera_mode='snapshot', timeout=5):
+        """Retorna o grabber da URL, iniciando a busca no primeiro inscrito.
+
+        O timeout vale por câmera e é o do primeiro inscrito enquanto o grabber existir.
+        """
+        key = (camera_url, camera_mode)
+        with cls._grabbers_lock:
+            grabber = cls._grabbers.get(key)
+            if grabber is None:
+                grabber = cls(camera_url, camera_mode, timeout=timeout)
+                cls._grabbers[key] = grabber
+            grabber.subscribers += 1
+            if grabber.thread is None or not grabber.thread.is_alive():
+                grabber.start()
+            return grabber
+
+    @classmethod
+    def release(cls, grabber):
+        """Remove um inscrito e para a thread quando não resta nenhum."""
+        with cls._grabbers_lock:
+            grabber.subscribers -= 1
+            if grabber.subscribers <= 0:
+                cls._grabbers.pop((grabber.camera_url, grabber.camera_mode), None)
+                grabber.stop()
+
+    def start(self):
+        self.stop_event.clear()
+        if self.fetcher == 'async':
+            camera_loop = CameraLoop.instance(self.decode_threads)
+            self.thread = camera_loop.thread  # Thread compartilhada por todas as câmeras
+            camera_loop.add(self)
+        else:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        logging.info(f"Grabber iniciado para a câmera {self.camera_url}.")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.fetcher == 'async':
+            CameraLoop.instance(self.decode_threads).remove(self)
+        with self.condition:
+            self.condition.notify_all()
+        logging.info(f"Grabber parado para a câmera {self.camera_url}.")
+
+    def matches(self, camera_url, camera_mode):
+        return self.camera_url == camera_url and self.camera_mode == camera_mode
+
+    def _run(self):
+        source = create_camera_source(self.camera_url, self.camera_mode, timeout=self.timeout)
+        try:
+            self._grab_loop(source)
+        finally:
+            source.close()
+
+    def _grab_loop(self, source):
+        while not self.stop_event.is_set():
+            try:
+                with registry.time('camera_stage_seconds', camera=self.camera_url, stage='fetch'):
+                    data = source.read()
+                self.publish(data)
+                self.fetch_succeeded()
+            except Exception as e:
+                self.stop_event.wait(self.fetch_failed(e))
+
+    def publish(self, data):
+        """Decodifica o JPEG (se mudou) e publica o quadro para os inscritos."""
+        raw_hash = hashlib.blake2b(data, digest_size=16).digest()
+        latest = self.latest
+        if latest is not None and latest.raw_hash == raw_hash:
+            # JPEG idêntico ao anterior: reaproveita a imagem já decodificada
+            img, jpeg, scale = latest.image, latest.jpeg, latest.scale
+            self.decode_skips += 1
+        else:
+            with registry.time('camera_stage_seconds', camera=self.camera_url, stage='decode'):
+                img, scale = decode_frame(data, self.decode_size)
+            # Quadro compartilhado entre os grupos: somente leitura para que ninguém o altere no lugar
+            img.setflags(write=False)
+            # O buffer da fonte é reaproveitado na próxima leitura: guarda só o JPEG comprimido
+            jpeg = data.tobytes() if scale > 1 else None
+            self.decoded += 1
+        with self.condition:
+            self.seq += 1
+            self.latest = GrabbedFrame(self.seq, time.time(), img, raw_hash, jpeg, scale)
+            self.condition.notify_all()
+
+    def fetch_succeeded(self):
+        if self.consecutive_failures:
+            logging.info(f"Câmera {self.camera_url} voltou a responder após {self.consecutive_failures} falha(s).")
+        self.consecutive_failures = 0
+        self.backoff = 0.0
+
+    def fetch_failed(self, error):
+        """Registra a falha e retorna quantos segundos esperar antes da próxima tentativa."""
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.backoff = float(min(self.retry_interval * 2 ** (self.consecutive_failures - 1), self.max_backoff))
+        registry.inc('camera_errors_total', camera=self.camera_url)
+        logging.error(f"Erro ao capturar quadro da câmera {self.camera_url}: {str(error) or type(error).__name__} "
+                      f"(nova tentativa em {self.backoff:g}s)",
+                      exc_info=not isinstance(error, TimeoutError), extra={'camera': self.camera_url})
+        return self.backoff
+
+    @classmethod
+    def stats(cls):
+        with cls._grabbers_lock:
+            return {
+                grabber.camera_url: {
+                    'mode': grabber.camera_mode,
+                    'subscribers': grabber.subscribers,
+                    'frames': grabber.seq,
+                    'decoded': grabber.decoded,
+                    'decode_skips': grabber.decode_skips,
+                    'failures': grabber.failures,
+                    'backoff': grabber.backoff,
+                }
+                for grabber in cls._grabbers.values()
+            }
+
+    def wait_for_frame(self, last_seq=0, timeout=5):
+        """Bloqueia até existir um quadro mais novo que `last_seq`; retorna None no timeout."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.stop_event.is_set() or (self.latest is not None and self.latest.seq > last_seq),
+                timeout=timeout
+            )
+            if self.latest is not None and self.latest.seq > last_seq:
+                return self.latest
+            return None
@@ -0,0 +1,69 @@
+# frame_publisher.py
+
+import threading
+import time
+
+import cv2
+
+
+class FramePublisher:
+    """Guarda o último quadro processado de um grupo já codificado em JPEG.
+
+    O quadro é codificado uma única vez, quando o processador o publica; o polling de
+    /live_feed e todos os clientes de /live_stream recebem os mesmos bytes em cache.
+    O publicador também sabe se há alguém assistindo: clientes de stream inscritos ou um
+    polling recente em /live_feed.
+    """
+
+    def __init__(self, jpeg_quality=80):
+        self.jpeg_quality = jpeg_quality
+        self.jpeg = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self.condition = threading.Condition()
+        self.viewers = 0
+        self.last_polled = 0.0
+
+    def publish(self, frame, seq=None):
+        """Codifica e publica o quadro; `seq` permite usar a numeração do próprio processador."""
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ret:
+            return False
+        with self.condition:
+            self.jpeg = buffer.tobytes()
+            self.seq = self.seq + 1 if seq is None else seq
+            self.timestamp = time.time()
+            self.condition.notify_all()
+        return True
+
+    def latest(self):
+        """Retorna (seq, bytes JPEG) do último quadro publicado; bytes é None se não houver quadro."""
+        with self.condition:
+            return self.seq, self.jpeg
+
+    def wait(self, last_seq, timeout=5):
+        """Aguarda um quadro mais novo que `last_seq`; retorna (seq, bytes) ou (last_seq, None) no timeout."""
+        with self.condition:
+            if self.condition.wait_for(lambda: self.seq > last_seq and self.jpeg is not None, timeout=timeout):
+                return self.seq, self.jpeg
+            return last_seq, None
+
+    def subscribe(self):
+        with self.condition:
+            self.viewers += 1
+
+    def unsubscribe(self):
+        with self.condition:
+            self.viewers = max(0, self.viewers - 1)
+
+    def touch(self):
+        """Marca um acesso por polling (/live_feed)."""
+        self.last_polled = time.time()
+
+    def has_viewers(self, poll_window=3.0):
+        return self.viewers > 0 or time.time() - self.last_polled < poll_window
+
+    def clear(self):
+        with self.condition:
+            self.jpeg = None
+            self.condition.notify_all()
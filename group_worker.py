@@ -0,0 +1,849 @@
+# group_worker.py
+"""Processamento ao vivo de grupos em processos separados (`processing_mode: "process"` ou "pool").
+
+Cada processo worker (WorkerHost) roda um grupo no modo 'process' ou vários grupos no modo
+'pool' (worker_pool.py). Para cada grupo, o worker roda o laço de captura, pré-filtro de
+movimento, inferência e capturas e publica os quadros anotados (JPEG) e as detecções em um anel de memória compartilhada
+(FrameRing). Qualquer processo web lê o último quadro e o status direto desse anel, sem
+serializar imagens; comandos (parar, capturar, captura contínua) vão por um canal local de
+`multiprocessing.connection`, cujo endereço o worker anota no próprio anel. Assim o Flask
+pode rodar com vários workers WSGI, desde que todos usem o mesmo SECRET_KEY.
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import pathlib
+import hashlib
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+
+import cv2
+import numpy as np
+
+MAGIC = b'NXFR'
+# magic, slots, tamanho do slot, tamanho da área de status, último seq, última leitura, versão do status
+_HEADER = struct.Struct('<4sIIIQdQ')
+# versão (ímpar durante a escrita), seq, instante da captura, bytes do JPEG, bytes dos metadados
+_SLOT_HEADER = struct.Struct('<QQdII')
+_LENGTH = struct.Struct('<I')
+_HEADER_SIZE = 64
+STATUS_SIZE = 8192
+HEARTBEAT_TIMEOUT = 5.0  # Segundos sem atualizar o status para considerar o worker morto
+
+# Protege a troca temporária de resource_tracker.register, que vale para o processo inteiro
+_attach_lock = threading.Lock()
+
+
+def ring_name(group_name):
+    # Nome curto e estável: o macOS limita nomes de memória compartilhada a 31 caracteres
+    return 'nxt_' + hashlib.sha1(group_name.encode('utf-8')).hexdigest()[:16]
+
+
+def status_alive(status):
+    return bool(status) and time.time() - status.get('heartbeat', 0.0) < HEARTBEAT_TIMEOUT
+
+
+def control_authkey(secret_key):
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode('utf-8')
+    return hashlib.sha256(b'group-worker:' + secret_key).digest()
+
+
+class FrameRing:
+    """Anel de quadros JPEG + metadados JSON em memória compartilhada, com um escritor e vários leitores.
+
+    Cada slot e a área de status usam um contador de versão (seqlock): o escritor o deixa ímpar
+    durante a escrita e o leitor descarta a cópia se a versão mudou no meio dela. Os leitores
+    também anotam o instante da última leitura, que o worker usa para só desenhar e codificar
+    quadros quando alguém está assistindo.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        self.status_lock = threading.Lock()  # O seqlock do status supõe um único escritor por vez
+        magic, self.slots, self.slot_size, self.status_size, _, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Memória compartilhada {shm.name} não é um anel de quadros")
+        self.status_offset = _HEADER_SIZE
+        self.slots_offset = self.status_offset + self.status_size
+
+    @classmethod
+    def create(cls, name, slots=3, slot_size=1024 * 1024, status_size=STATUS_SIZE):
+        """Cria o anel; FileExistsError se outro worker vivo já usa o nome."""
+        size = _HEADER_SIZE + status_size + slots * (_SLOT_HEADER.size + slot_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            try:
+                existing = cls.attach(name)
+            except (FileNotFoundError, ValueError):
+                existing = None
+            if existing is not None and status_alive(existing.status()):
+                raise
+            # Sobra de um worker que morreu sem limpar
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_size, status_size, 0, 0.0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Conecta a um anel existente; FileNotFoundError se nenhum worker o criou."""
+        # O leitor não é dono do segmento: sem isso o resource_tracker o removeria ao fim do processo
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            from multiprocessing import resource_tracker
+            with _attach_lock:
+                register = resource_tracker.register
+                resource_tracker.register = lambda *args: None
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                finally:
+                    resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    def _field(self, fmt, offset):
+        return struct.unpack_from(fmt, self.buf, offset)[0]
+
+    def _slot_offset(self, index):
+        return self.slots_offset + index * (_SLOT_HEADER.size + self.slot_size)
+
+    def publish(self, seq, timestamp, jpeg, meta):
+        """Escreve o quadro no próximo slot; False se não couber no slot."""
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        if len(jpeg) + len(meta_bytes) > self.slot_size:
+            return False
+        offset = self._slot_offset(seq % self.slots)
+        version = self._field('<Q', offset)
+        struct.pack_into('<Q', self.buf, offset, version + 1)
+        data = offset + _SLOT_HEADER.size
+        self.buf[data:data + len(jpeg)] = jpeg
+        self.buf[data + len(jpeg):data + len(jpeg) + len(meta_bytes)] = meta_bytes
+        _SLOT_HEADER.pack_into(self.buf, offset, version + 2, seq, timestamp, len(jpeg), len(meta_bytes))
+        struct.pack_into('<Q', self.buf, 16, seq)  # Último seq publicado
+        return True
+
+    def latest_seq(self):
+        return self._field('<Q', 16)
+
+    def latest(self, retries=5):
+        """Retorna (seq, instante, bytes JPEG, metadados) do último quadro ou None."""
+        for _ in range(retries):
+            seq = self.latest_seq()
+            if seq == 0:
+                return None
+            offset = self._slot_offset(seq % self.slots)
+            version, slot_seq, timestamp, jpeg_len, meta_len = _SLOT_HEADER.unpack_from(self.buf, offset)
+            if version % 2 or slot_seq != seq:
+                continue
+            data = offset + _SLOT_HEADER.size
+            jpeg = bytes(self.buf[data:data + jpeg_len])
+            meta_bytes = bytes(self.buf[data + jpeg_len:data + jpeg_len + meta_len])
+            if self._field('<Q', offset) == version:
+                return seq, timestamp, jpeg, json.loads(meta_bytes)
+        return None
+
+    def set_status(self, status):
+        payload = json.dumps(status).encode('utf-8')[:self.status_size - 8 - _LENGTH.size]
+        with self.status_lock:
+            version = self._field('<Q', 32)
+            struct.pack_into('<Q', self.buf, 32, version + 1)
+            _LENGTH.pack_into(self.buf, self.status_offset, len(payload))
+            start = self.status_offset + _LENGTH.size
+            self.buf[start:start + len(payload)] = payload
+            struct.pack_into('<Q', self.buf, 32, version + 2)
+
+    def status(self, retries=5):
+        for _ in range(retries):
+            version = self._field('<Q', 32)
+            if version % 2:
+                continue
+            length = _LENGTH.unpack_from(self.buf, self.status_offset)[0]
+            start = self.status_offset + _LENGTH.size
+            payload = bytes(self.buf[start:start + length])
+            if self._field('<Q', 32) != version:
+                continue
+            try:
+                return json.loads(payload) if payload else {}
+            except ValueError:
+                continue  # Cópia rasgada (JSON ou UTF-8 inválido): conta como leitura falha
+        return {}
+
+    def touch(self):
+        """Marca uma leitura por um cliente (polling ou stream)."""
+        struct.pack_into('<d', self.buf, 24, time.time())
+
+    def has_viewers(self, poll_window=3.0):
+        return time.time() - self._field('<d', 24) < poll_window
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _Results:
+    """Resultados no mesmo formato do detector, guardados para reaproveitar quando a cena está parada."""
+
+    def __init__(self, results):
+        detections = results.xyxy[0]
+        if hasattr(detections, 'cpu'):
+            detections = detections.cpu().numpy()
+        self.detections = np.asarray(detections)
+
+
+class GroupRunner:
+    """Laço ao vivo de um grupo dentro de um processo worker (WorkerHost)."""
+
+    def __init__(self, host, group_name, config):
+        self.host = host
+        self.group_name = group_name
+        self.config = config
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.continuous_until = 0.0
+        self.last_capture_time = time.time()
+        self.current = None  # (quadro capturado, _Results) mais recente
+        self.model = None
+        self.active = True
+        self.started = time.time()
+        self.model_status = {'status': 'loading', 'error': None}
+
+        from motion_gate import MotionGate
+        from rate_controller import RateController
+        settings = host.settings
+        self.motion_gate = MotionGate(
+            threshold=settings.get('motion_threshold', 2.0),
+            max_skip_seconds=settings.get('motion_max_skip_seconds', 5.0)
+        )
+        self.rate_controller = RateController(
+            target_fps=settings.get('live_target_fps', 10),
+            min_fps=settings.get('live_min_fps', 1),
+            idle_fps=settings.get('live_idle_fps', 2),
+            latency_budget=settings.get('live_latency_budget', 0.5),
+            cpu_budget=settings.get('live_cpu_budget', 0.8)
+        )
+        self.capture_dir = os.path.join('static', 'captures', group_name)
+        os.makedirs(self.capture_dir, exist_ok=True)
+        # FileExistsError se o grupo já roda em outro worker
+        self.ring = FrameRing.create(
+            ring_name(group_name),
+            slot_size=int(settings.get('worker_frame_slot_mb', 1) * 1024 * 1024)
+        )
+        self.update_status()
+
+    def update_status(self):
+        active = self.active
+        self.ring.set_status({
+            'group_name': self.group_name,
+            'pid': os.getpid(),
+            'worker': self.host.name,
+            'address': self.host.listener.address,
+            'started': self.started,
+            'heartbeat': time.time(),
+            'processing_active': active and not self.stop_event.is_set(),
+            'capturing': active and time.time() < self.continuous_until,
+            'model_loaded': self.model is not None,
+            'model_status': self.model_status,
+            'motion_gate': self.motion_gate.stats(),
+            'rate': self.rate_controller.stats(),
+        })
+
+    def load_model(self):
+        from model_cache import ModelCache, ModelLoader
+        try:
+            self.model = ModelLoader.load_async(self.group_name, self.config['model_path']).result()
+        except Exception as e:
+            logging.error(f"Erro ao carregar o modelo para o grupo '{self.group_name}': {e}")
+            self.model_status = {'status': 'failed', 'error': str(e)}
+            return False
+        ModelCache.pin(self.model)
+        self.model_status = {'status': 'ready', 'error': None}
+        logging.info(f"Modelo carregado com sucesso para o grupo '{self.group_name}' (worker {self.host.name})")
+        return True
+
+    def handle_command(self, command, *args):
+        if command == 'stop':
+            self.stop_event.set()
+            return True, 'Processamento ao vivo parado.'
+        if command == 'capture':
+            return self.capture_current(None, None, timeout=2)
+        if command == 'start_continuous':
+            self.continuous_until = time.time() + float(args[0])
+            return True, 'Captura contínua iniciada.'
+        if command == 'stop_continuous':
+            self.continuous_until = 0.0
+            return True, 'Captura contínua parada.'
+        return False, f"Comando desconhecido: {command}"
+
+    # Capturas
+    def capture_current(self, class_name, confidence, timeout=None):
+        """Salva o quadro atual em resolução cheia com as últimas detecções."""
+        from preprocessing import full_resolution_image, draw_detections
+        with self.lock:
+            current = self.current
+        if current is None:
+            return False, 'Nenhuma imagem disponível para capturar.'
+        grabbed, results = current
+        names = self.model.names
+
+        def render_full_resolution():
+            img = full_resolution_image(grabbed.jpeg, grabbed.image, grabbed.scale)
+            return draw_detections(img, results.detections, names, scale=grabbed.scale)
+
+        filename = f"capture_{int(time.time() * 1000)}.jpg"
+
+        def on_written(filename):
+            self.host.ranking_store.add_image(self.group_name, filename, class_name, confidence)
+
+        if not self.host.capture_writer.submit(render_full_resolution, os.path.join(self.capture_dir, filename),
+                                               on_written, timeout=timeout, group_name=self.group_name):
+            return False, 'Fila de gravação cheia. Tente novamente.'
+        return True, 'Imagem capturada com sucesso.'
+
+    def process_detections(self, results):
+        from ranking_store import best_detection
+        now = time.time()
+        if now < self.continuous_until and now - self.last_capture_time >= 2:
+            # Captura contínua: salva a cada 2 segundos, como em GroupProcessor.capture_image
+            self.capture_current(None, 0.0, timeout=2)
+            self.last_capture_time = now
+        elif len(results.detections) > 0 and now - self.last_capture_time >= 2:
+            class_name, confidence = best_detection(results.detections, self.model.names)
+            self.capture_current(class_name, confidence)
+            self.last_capture_time = now
+
+    # Laço principal
+    def publish(self, grabbed, results, seq):
+        from preprocessing import draw_detections
+        # grabbed.image é compartilhado e somente leitura: desenha em uma cópia
+        frame = draw_detections(grabbed.image.copy(), results.detections, self.model.names)
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+        if ok:
+            meta = {'detections': results.detections.tolist(), 'names': self.model.names, 'scale': grabbed.scale}
+            if not self.ring.publish(seq, grabbed.timestamp, buffer.tobytes(), meta):
+                logging.warning(f"Quadro maior que o slot do anel para o grupo {self.group_name}; "
+                                f"aumente 'worker_frame_slot_mb'.", extra={'group': self.group_name})
+
+    def run(self):
+        try:
+            if self.load_model():
+                self.live_loop()
+            else:
+                # Mantém o status de falha visível até alguém pedir para parar
+                self.active = False
+                with self.host.lock:  # Não concorre com a atualização do status pelo heartbeat
+                    self.update_status()
+                self.stop_event.wait()
+        finally:
+            self.close()
+            self.host.runner_finished(self)
+
+    def live_loop(self):
+        from frame_grabber import FrameGrabber
+        grabber = FrameGrabber.acquire(self.config['camera_url'], self.config['camera_mode'],
+                                       self.config.get('camera_timeout', 5))
+        last_seq = 0
+        results_seq = published_seq = 0
+        results = None
+        try:
+            while not self.stop_event.is_set():
+                iteration_start = time.time()
+                try:
+                    grabbed = grabber.wait_for_frame(last_seq, timeout=1)
+                    if grabbed is None:
+                        continue
+                    last_seq = grabbed.seq
+                    start = time.time()
+                    if self.motion_gate.should_infer(grabbed.image, grabbed.raw_hash, force=results is None):
+                        results = _Results(self.host.profile.run(self.model, grabbed.image))
+                        results_seq += 1
+                    with self.lock:
+                        self.current = (grabbed, results)
+                    self.process_detections(results)
+                    # Desenha e codifica só com alguém assistindo e quando há resultado novo
+                    if results_seq != published_seq and self.ring.has_viewers():
+                        self.publish(grabbed, results, results_seq)
+                        published_seq = results_seq
+                    finished = time.time()
+                    self.rate_controller.record(latency=finished - grabbed.timestamp, busy=finished - start)
+                except Exception as e:
+                    logging.error(f"Erro no processamento de vídeo ao vivo para o grupo {self.group_name}: {e}",
+                                  exc_info=True, extra={'group': self.group_name})
+                interval = self.rate_controller.interval(watched=self.ring.has_viewers())
+                self.stop_event.wait(max(0.0, interval - (time.time() - iteration_start)))
+        finally:
+            FrameGrabber.release(grabber)
+
+    def close(self):
+        from model_cache import ModelCache
+        if self.model is not None:
+            ModelCache.unpin(self.model)  # Continua no cache do worker para o próximo início do grupo
+        self.stop_event.set()
+        self.active = False
+        with self.host.lock:  # Sai dos grupos do heartbeat antes de fechar o anel
+            if self.host.runners.get(self.group_name) is self:
+                del self.host.runners[self.group_name]
+            # Heartbeat zerado: quem ainda tem o anel mapeado (read_status) vê o grupo parado
+            self.ring.set_status({'group_name': self.group_name, 'heartbeat': 0.0})
+            self.ring.close()
+        logging.info(f"Processamento parado para o grupo {self.group_name} (worker {self.host.name}).")
+
+
+class WorkerHost:
+    """Processo worker: modelo em cache, gravador, ranking e canal de controle compartilhados
+    pelos grupos que ele executa (cada grupo em uma thread GroupRunner).
+
+    No modo 'process' cada host roda um único grupo e termina quando ele para; no modo 'pool'
+    os hosts são fixos, presos a núcleos físicos (`cpus`) e aceitam até `capacity` grupos.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config['name']
+        self.settings = config['settings']
+        self.capacity = max(1, int(config.get('capacity', 1)))
+        self.cpus = config.get('cpus') or []
+        self.physical_cores = config.get('physical_cores')
+        self.exit_when_idle = config.get('exit_when_idle', False)
+        self.stop_event = threading.Event()
+        self.lock = threading.RLock()
+        self.runners = {}
+        self.resident = []  # Grupos cujo modelo já foi carregado neste worker
+        self.host_ring = None
+        self.started = time.time()
+
+    def setup(self):
+        from log_setup import setup_logging
+        base, ext = os.path.splitext(self.config['log_file'])
+        setup_logging(
+            f"{base}_{self.name}{ext or '.log'}",
+            max_bytes=self.settings.get('log_max_mb', 10) * 1024 * 1024,
+            backup_count=self.settings.get('log_backup_count', 5),
+            dedup_interval=self.settings.get('log_dedup_interval', 60)
+        )
+        if self.cpus and hasattr(os, 'sched_setaffinity'):
+            # Antes de criar as threads do PyTorch, que herdam a afinidade
+            os.sched_setaffinity(0, self.cpus)
+            logging.info(f"Worker {self.name} preso às CPUs {self.cpus}.")
+
+        yolov5_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5')
+        if yolov5_path not in sys.path:
+            sys.path.insert(0, yolov5_path)
+        if os.name == 'nt':
+            pathlib.PosixPath = pathlib.WindowsPath  # Mesmo ajuste do app.py para modelos salvos no Linux
+
+        from model_cache import ModelCache
+        from frame_grabber import FrameGrabber
+        from inference_profile import InferenceProfile
+        from capture_writer import CaptureWriter
+        from ranking_store import open_ranking_store
+
+        settings = self.settings
+        self.profile = InferenceProfile.from_settings(settings)
+        self.profile.rebalance_threads(1, 1, total_cpus=self.physical_cores)
+        ModelCache.configure(max_bytes=settings.get('model_cache_max_mb', 1024) * 1024 * 1024, profile=self.profile)
+        FrameGrabber.configure(
+            decode_size=self.profile.input_size if settings.get('reduced_decode', True) else None,
+            fetcher=settings.get('camera_fetcher', 'async'),
+            max_backoff=settings.get('camera_max_backoff', 30),
+            decode_threads=settings.get('camera_decode_threads', 2)
+        )
+        self.capture_writer = CaptureWriter(
+            queue_size=settings.get('capture_queue_size', 64),
+            jpeg_quality=settings.get('capture_jpeg_quality', 95)
+        )
+        self.capture_writer.start()
+        self.ranking_store = open_ranking_store(self.config['ranking_db'])
+        self.listener = Listener(authkey=self.config['authkey'])
+        if self.config.get('host_ring'):
+            self.host_ring = FrameRing.create(self.config['host_ring'], slots=0, slot_size=0)
+            self.update_status()
+
+    def update_status(self):
+        with self.lock:
+            for runner in list(self.runners.values()):
+                runner.update_status()
+            if self.host_ring is not None:
+                self.host_ring.set_status({
+                    'worker': self.name,
+                    'pid': os.getpid(),
+                    'address': self.listener.address,
+                    'started': self.started,
+                    'heartbeat': time.time(),
+                    'cpus': list(self.cpus),
+                    'capacity': self.capacity,
+                    'groups': sorted(self.runners),
+                    'resident': list(self.resident),
+                    'threads': self.profile.current_threads,
+                })
+
+    def heartbeat(self):
+        # Status atualizado mesmo durante o carregamento do modelo ou com a câmera parada
+        while not self.stop_event.wait(1.0):
+            self.update_status()
+
+    def rebalance(self):
+        # Os grupos do worker dividem os núcleos físicos dele
+        active = max(1, len(self.runners))
+        self.profile.rebalance_threads(active, active, total_cpus=self.physical_cores)
+
+    def start_group(self, group_name, config):
+        with self.lock:
+            if group_name in self.runners:
+                return True, 'Processamento já iniciado.'
+            if len(self.runners) >= self.capacity:
+                return False, 'full'
+            try:
+                runner = GroupRunner(self, group_name, config)
+            except FileExistsError:
+                return False, f"O grupo {group_name} já está em processamento em outro worker."
+            self.runners[group_name] = runner
+            if group_name not in self.resident:
+                self.resident.append(group_name)
+            self.rebalance()
+            self.update_status()  # O pool vê o grupo novo sem esperar o heartbeat
+        threading.Thread(target=runner.run, name=f"live-{group_name}", daemon=True).start()
+        logging.info(f"Iniciado processamento para o grupo {group_name} no worker {self.name}.")
+        return True, 'Processamento ao vivo iniciado.'
+
+    def runner_finished(self, runner):
+        with self.lock:
+            self.rebalance()
+            if self.runners or not self.exit_when_idle:
+                self.update_status()
+            if self.exit_when_idle and not self.runners:
+                self.stop_event.set()
+
+    # Canal de controle
+    def serve_control(self):
+        while not self.stop_event.is_set():
+            try:
+                connection = self.listener.accept()
+            except Exception:
+                if self.stop_event.is_set():
+                    break
+                continue
+            try:
+                with connection:
+                    command, group_name, *args = connection.recv()
+                    connection.send(self.handle_command(command, group_name, *args))
+            except Exception as e:
+                logging.warning(f"Erro no canal de controle do worker {self.name}: {e}")
+
+    def handle_command(self, command, group_name, *args):
+        if command == 'start':
+            return self.start_group(group_name, *args)
+        if command == 'shutdown':
+            self.stop_event.set()
+            return True, f"Worker {self.name} encerrando."
+        with self.lock:
+            runner = self.runners.get(group_name)
+        if runner is None:
+            return False, f"O grupo {group_name} não está em processamento neste worker."
+        return runner.handle_command(command, *args)
+
+    def run(self):
+        self.setup()
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat, name='worker-heartbeat', daemon=True)
+        self.heartbeat_thread.start()
+        threading.Thread(target=self.serve_control, name='worker-control', daemon=True).start()
+        if self.config.get('initial_group'):
+            group_name, group_config = self.config['initial_group']
+            ok, message = self.start_group(group_name, group_config)
+            if not ok:
+                logging.error(f"Worker {self.name}: {message}")
+                return
+        self.stop_event.wait()
+
+    def shutdown(self):
+        self.stop_event.set()
+        with self.lock:
+            runners = list(self.runners.values())
+        for runner in runners:
+            runner.stop_event.set()
+        deadline = time.time() + 5
+        while self.runners and time.time() < deadline:
+            time.sleep(0.05)
+        if hasattr(self, 'heartbeat_thread'):
+            self.heartbeat_thread.join(timeout=2)
+        if hasattr(self, 'capture_writer'):
+            self.capture_writer.flush()
+        if self.host_ring is not None:
+            with self.lock:
+                self.host_ring.set_status({'worker': self.name, 'heartbeat': 0.0})
+                self.host_ring.close()
+        if hasattr(self, 'listener'):
+            self.listener.close()
+        if hasattr(self, 'ranking_store'):
+            self.ranking_store.close()
+        logging.info(f"Worker {self.name} encerrado.")
+
+
+def run_worker_host(config):
+    """Ponto de entrada do processo worker."""
+    os.chdir(config['workdir'])
+    host = WorkerHost(config)
+    try:
+        host.run()
+    finally:
+        host.shutdown()
+
+
+def spawn_worker_host(config):
+    # 'spawn' não herda threads nem locks do processo web
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=run_worker_host, args=(dict(config, workdir=os.getcwd()),),
+                              name=f"worker-{config['name']}", daemon=True)
+    process.start()
+    return process
+
+
+def send_command(address, authkey, command, group_name, *args, timeout=10):
+    """Envia um comando ao canal de controle de um worker; retorna (ok, mensagem)."""
+    try:
+        with Client(address, authkey=authkey) as connection:
+            connection.send((command, group_name) + args)
+            if not connection.poll(timeout):
+                return False, 'Worker não respondeu.'
+            return connection.recv()
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        logging.error(f"Erro ao enviar '{command}' ao worker do grupo {group_name}: {e}", extra={'group': group_name})
+        return False, 'Worker não está em execução.'
+
+
+_attached_rings = {}  # nome -> FrameRing conectado por read_status
+_attached_rings_lock = threading.Lock()
+
+
+def read_status(name):
+    """Status publicado no anel `name`, ou {} se ele não existir.
+
+    O anel conectado fica guardado; só se reconecta quando o status dele deixa de estar vivo,
+    pois o worker pode ter removido o anel ou um novo worker pode ter criado outro com o mesmo nome.
+    """
+    with _attached_rings_lock:
+        ring = _attached_rings.get(name)
+        if ring is not None:
+            status = ring.status()
+            if status_alive(status):
+                return status
+        try:
+            ring = _attached_rings[name] = FrameRing.attach(name)
+        except (FileNotFoundError, ValueError):
+            _attached_rings.pop(name, None)  # O anel antigo é fechado pelo coletor
+            return {}
+        return ring.status()
+
+
+def remove_ring(name):
+    """Remove o anel `name` deixado por um worker que terminou sem limpá-lo."""
+    with _attached_rings_lock:
+        ring = _attached_rings.pop(name, None)
+    if ring is not None:
+        ring.close()
+    try:
+        # Conexão rastreada de propósito: unlink() também cancela o registro feito pelo worker
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def worker_running(group_name):
+    """True se há um worker vivo processando o grupo (iniciado por este ou por outro processo web)."""
+    return status_alive(read_status(ring_name(group_name)))
+
+
+class ProcessLauncher:
+    """Modo 'process': um processo worker dedicado por grupo."""
+
+    def __init__(self, config_factory, authkey):
+        self.config_factory = config_factory
+        self.authkey = authkey
+        self.processes = {}
+
+    def launch(self, group_name):
+        config = self.config_factory(group_name)
+        config.update(name=ring_name(group_name), authkey=self.authkey, capacity=1,
+                      exit_when_idle=True, initial_group=(group_name, config.copy()))
+        self.processes[group_name] = process = spawn_worker_host(config)
+        return process.is_alive
+
+    def join(self, group_name):
+        process = self.processes.pop(group_name, None)
+        if process is None:
+            return
+        process.join(timeout=10)
+        if process.is_alive():
+            logging.warning(f"Worker do grupo {group_name} não parou a tempo; encerrando.")
+            process.terminate()
+
+
+class _RemoteStats:
+    """Expõe uma seção do status do worker com a mesma interface de RateController/MotionGate."""
+
+    def __init__(self, processor, key):
+        self.processor = processor
+        self.key = key
+
+    def stats(self):
+        return self.processor.status().get(self.key, {})
+
+    def effective_fps(self):
+        return self.stats().get('effective_fps', 0.0)
+
+
+class SharedFramePublisher:
+    """Leitura do último quadro do anel com a interface de FramePublisher usada pelas rotas."""
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    def latest(self):
+        ring = self.processor.ring()
+        frame = ring.latest() if ring is not None else None
+        if frame is None:
+            return 0, None
+        return frame[0], frame[2]
+
+    def wait(self, last_seq, timeout=5, poll_interval=0.02):
+        deadline = time.time() + timeout
+        while True:
+            self.touch()
+            seq, jpeg = self.latest()
+            if seq > last_seq and jpeg is not None:
+                return seq, jpeg
+            if time.time() >= deadline:
+                return last_seq, None
+            time.sleep(poll_interval)
+
+    def touch(self):
+        ring = self.processor.ring()
+        if ring is not None:
+            ring.touch()
+
+    # Clientes de stream marcam leitura a cada quadro em wait()
+    subscribe = touch
+
+    def unsubscribe(self):
+        pass
+
+    def has_viewers(self, poll_window=3.0):
+        ring = self.processor.ring()
+        return ring is not None and ring.has_viewers(poll_window)
+
+
+class WorkerGroupProcessor:
+    """Contraparte no processo web de um grupo que roda em um processo worker, com a interface
+    de GroupProcessor usada pelas rotas.
+
+    Pode ser criado em qualquer worker WSGI: o estado vem do anel compartilhado e os comandos
+    vão pelo canal de controle. `launcher` (ProcessLauncher ou WorkerPool) decide em qual
+    processo o grupo roda; a configuração é montada na hora de iniciar, então mudanças de
+    câmera valem a partir do próximo início.
+    """
+
+    def __init__(self, group_name, launcher, authkey):
+        self.group_name = group_name
+        self.launcher = launcher
+        self.authkey = authkey
+        self._ring = None
+        self.publisher = SharedFramePublisher(self)
+        self.rate_controller = _RemoteStats(self, 'rate')
+        self.motion_gate = _RemoteStats(self, 'motion_gate')
+
+    def ring(self):
+        """Anel atual do grupo; reconecta se o grupo foi reiniciado."""
+        ring = self._ring
+        if ring is not None and status_alive(ring.status()):
+            return ring
+        try:
+            self._ring = FrameRing.attach(ring_name(self.group_name))
+        except (FileNotFoundError, ValueError):
+            return ring
+        return self._ring  # O anel antigo é fechado pelo coletor quando ninguém mais o usa
+
+    def status(self):
+        ring = self.ring()
+        status = ring.status() if ring is not None else {}
+        if not status_alive(status):
+            status = dict(status, processing_active=False, capturing=False, model_loaded=False)
+        return status
+
+    @property
+    def processing_active(self):
+        return self.status().get('processing_active', False)
+
+    @property
+    def capturing(self):
+        return self.status().get('capturing', False)
+
+    @property
+    def model_loaded(self):
+        return self.status().get('model_loaded', False)
+
+    def model_status(self):
+        return self.status().get('model_status') or {'status': 'loading', 'error': None}
+
+    def send(self, command, *args, timeout=10):
+        """Envia um comando ao worker do grupo; retorna (ok, mensagem)."""
+        status = self.status()
+        if not status_alive(status) or not status.get('address'):
+            return False, 'Worker do grupo não está em execução.'
+        return send_command(status['address'], self.authkey, command, self.group_name, *args, timeout=timeout)
+
+    def start_processing(self):
+        status = self.status()
+        if status.get('processing_active'):
+            logging.warning(f"Processamento já iniciado para o grupo {self.group_name}.")
+            return
+        if status_alive(status):
+            self.stop_processing()  # Grupo que falhou ao carregar o modelo
+        is_running = self.launcher.launch(self.group_name)
+        # Aguarda o anel do grupo para que as rotas seguintes já o encontrem
+        deadline = time.time() + 30
+        while time.time() < deadline and is_running() and not status_alive(self.status()):
+            time.sleep(0.05)
+
+    def stop_processing(self):
+        ok, message = self.send('stop')
+        if not ok:
+            logging.warning(f"Processamento não está ativo para o grupo {self.group_name}: {message}")
+        self.launcher.join(self.group_name)
+        # O grupo pode ter sido iniciado por outro processo web: espera o anel ser removido
+        deadline = time.time() + 10
+        while time.time() < deadline and read_status(ring_name(self.group_name)):
+            time.sleep(0.1)
+        logging.info(f"Processamento parado para o grupo {self.group_name}.")
+
+    def capture_now(self):
+        return self.send('capture')
+
+    def start_continuous_capture(self, duration):
+        return self.send('start_continuous', duration)
+
+    def stop_continuous_capture(self):
+        return self.send('stop_continuous')
+
+    def publish_frame(self):
+        pass  # O worker publica sozinho quando o anel tem leitores
+
+    def profiled_threads(self):
+        return {}  # As threads do grupo estão no processo worker
@@ -0,0 +1,92 @@
+# inference_profile.py
+
+import os
+import logging
+import threading
+
+import torch
+
+# Modos de execução em CPU aceitos em settings.json ('inference_mode')
+INFERENCE_MODES = ('fp32', 'channels_last', 'int8')
+# Backends aceitos em settings.json ('inference_backend')
+INFERENCE_BACKENDS = ('torch', 'onnx')
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class InferenceProfile:
+    """Perfil de inferência da instalação: modo de execução, tamanho de entrada e threads.
+
+    - 'fp32': modelo original;
+    - 'channels_last': pesos em formato NHWC, mais rápido nas convoluções em CPU (a entrada
+      é montada pelo AutoShape e segue em NCHW);
+    - 'int8': convoluções quantizadas em int8 pelo onnxruntime sobre a exportação ONNX; o
+      detector do YOLOv5 só tem convoluções, que o PyTorch não quantiza sem calibração, então
+      este modo sempre usa o backend 'onnx'.
+
+    Com o backend 'onnx' o modelo é exportado uma vez e executado pelo onnxruntime; ali só
+    fp32 e int8 fazem diferença ('channels_last' é ignorado).
+    """
+
+    def __init__(self, mode='fp32', input_size=640, num_threads=None, backend='torch'):
+        if mode not in INFERENCE_MODES:
+            logging.warning(f"Modo de inferência desconhecido '{mode}'. Usando 'fp32'.")
+            mode = 'fp32'
+        if backend not in INFERENCE_BACKENDS:
+            logging.warning(f"Backend de inferência desconhecido '{backend}'. Usando 'torch'.")
+            backend = 'torch'
+        if mode == 'int8' and backend != 'onnx':
+            logging.info("O modo de inferência 'int8' usa o backend 'onnx'.")
+            backend = 'onnx'
+        self.mode = mode
+        self.backend = backend
+        self.input_size = int(input_size)
+        # None: divide as CPUs disponíveis entre os processadores ativos
+        self.num_threads = num_threads
+        self.lock = threading.Lock()
+        self.current_threads = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            mode=settings.get('inference_mode', 'fp32'),
+            input_size=settings.get('inference_input_size', 640),
+            num_threads=settings.get('inference_threads'),
+            backend=settings.get('inference_backend', 'torch')
+        )
+
+    def apply(self, model):
+        """Prepara um modelo recém-carregado para o modo do perfil."""
+        if self.mode == 'channels_last':
+            model = model.to(memory_format=torch.channels_last)
+        model.eval()
+        return model
+
+    def run(self, model, img):
+        """Executa o modelo com o tamanho de entrada configurado."""
+        with torch.inference_mode():
+            return model(img, size=self.input_size)
+
+    def rebalance_threads(self, active_processors, concurrent_workers, total_cpus=None):
+        """Reparte as threads intra-op do PyTorch entre as inferências que rodam ao mesmo tempo.
+
+        `torch.set_num_threads` vale para o processo inteiro, então o total de CPUs é dividido
+        pelo número de inferências simultâneas possíveis (workers ocupados pelos grupos ativos).
+        `total_cpus` substitui as CPUs disponíveis (ex.: núcleos físicos de um worker do pool).
+        """
+        if self.num_threads:
+            threads = int(self.num_threads)
+        else:
+            concurrent = max(1, min(int(active_processors), int(concurrent_workers)))
+            threads = max(1, (total_cpus or available_cpus()) // concurrent)
+        with self.lock:
+            if threads != self.current_threads:
+                torch.set_num_threads(threads)
+                self.current_threads = threads
+                logging.info(f"Threads de inferência ajustadas para {threads} ({active_processors} grupo(s) ativo(s)).")
+        return threads
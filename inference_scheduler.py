@@ -0,0 +1,160 @@
+# inference_scheduler.py
+
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+
+class _GroupQueue:
+    def __init__(self, queue_size):
+        self.frames = deque()
+        self.queue_size = queue_size
+        self.priority = deque()  # Jobs que não podem ser descartados (ex.: captura contínua)
+        self.busy = False
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def has_pending(self):
+        return bool(self.priority or self.frames)
+
+
+class InferenceScheduler:
+    """Escalonador central de inferência com fila limitada por grupo e round-robin entre grupos.
+
+    Cada grupo tem no máximo `queue_size` quadros pendentes; ao chegar um novo, o mais antigo
+    é descartado (o quadro mais recente vence). Um mesmo grupo nunca roda em dois workers ao
+    mesmo tempo, pois o modelo e o processamento de detecções do grupo não são thread-safe.
+    """
+
+    def __init__(self, num_workers=1, queue_size=1):
+        self.num_workers = max(1, int(num_workers))
+        self.queue_size = max(1, int(queue_size))
+        self.queues = {}
+        self.ready = deque()  # Grupos com trabalho pendente e sem job em execução
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.running = {}  # Ident da thread do worker -> grupo do job em execução
+
+    def start(self):
+        """Inicia os workers; chamadas repetidas não têm efeito."""
+        with self.condition:
+            if self.workers:
+                return
+            self.stop_event.clear()
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"inference-worker-{i}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+        logging.info(f"Escalonador de inferência iniciado com {self.num_workers} worker(s).")
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join(timeout=5)
+        self.workers = []
+
+    def unregister(self, group_name):
+        """Cancela os quadros ainda pendentes do grupo (o job em execução termina normalmente)."""
+        with self.condition:
+            group_queue = self.queues.get(group_name)
+            if group_queue is None:
+                return
+            for future, _, _ in list(group_queue.frames) + list(group_queue.priority):
+                future.cancel()
+            group_queue.frames.clear()
+            group_queue.priority.clear()
+            if group_name in self.ready:
+                self.ready.remove(group_name)
+
+    def _enqueue(self, group_name, fn, args, droppable):
+        future = Future()
+        with self.condition:
+            group_queue = self.queues.get(group_name)
+            if group_queue is None:
+                group_queue = self.queues[group_name] = _GroupQueue(self.queue_size)
+            group_queue.submitted += 1
+            if droppable:
+                if len(group_queue.frames) >= group_queue.queue_size:
+                    stale_future, _, _ = group_queue.frames.popleft()
+                    stale_future.cancel()
+                    group_queue.dropped += 1
+                group_queue.frames.append((future, fn, args))
+            else:
+                group_queue.priority.append((future, fn, args))
+            if not group_queue.busy and group_name not in self.ready:
+                self.ready.append(group_name)
+                self.condition.notify()
+        return future
+
+    def submit(self, group_name, fn, *args):
+        """Enfileira um quadro descartável; retorna um Future cancelado se o quadro for descartado."""
+        return self._enqueue(group_name, fn, args, droppable=True)
+
+    def call(self, group_name, fn, *args, timeout=None):
+        """Executa `fn` na vez do grupo, sem descarte, e aguarda o resultado."""
+        return self._enqueue(group_name, fn, args, droppable=False).result(timeout=timeout)
+
+    def _next_job(self):
+        with self.condition:
+            while not self.ready and not self.stop_event.is_set():
+                self.condition.wait()
+            if self.stop_event.is_set():
+                return None, None
+            group_name = self.ready.popleft()
+            group_queue = self.queues[group_name]
+            job = group_queue.priority.popleft() if group_queue.priority else group_queue.frames.popleft()
+            group_queue.busy = True
+            return group_name, job
+
+    def _finish_job(self, group_name, ran):
+        with self.condition:
+            group_queue = self.queues[group_name]
+            group_queue.busy = False
+            if ran:
+                group_queue.processed += 1
+            # Volta para o fim da fila de prontos: round-robin entre os grupos
+            if group_queue.has_pending():
+                self.ready.append(group_name)
+                self.condition.notify()
+
+    def _worker_loop(self):
+        while not self.stop_event.is_set():
+            group_name, job = self._next_job()
+            if job is None:
+                continue
+            future, fn, args = job
+            ran = False
+            self.running[threading.get_ident()] = group_name
+            try:
+                ran = future.set_running_or_notify_cancel()
+                if ran:
+                    try:
+                        future.set_result(fn(*args))
+                    except Exception as e:
+                        logging.error(f"Erro na inferência do grupo {group_name}: {e}",
+                                      exc_info=True, extra={'group': group_name})
+                        future.set_exception(e)
+            finally:
+                self.running.pop(threading.get_ident(), None)
+                self._finish_job(group_name, ran)
+
+    def threads_for(self, group_name):
+        """Idents dos workers que estão executando um job do grupo neste instante."""
+        return [ident for ident, running_group in list(self.running.items()) if running_group == group_name]
+
+    def stats(self):
+        with self.condition:
+            return {
+                group_name: {
+                    'pending': len(group_queue.frames) + len(group_queue.priority),
+                    'submitted': group_queue.submitted,
+                    'processed': group_queue.processed,
+                    'dropped': group_queue.dropped,
+                }
+                for group_name, group_queue in self.queues.items()
+            }
@@ -0,0 +1,107 @@
+# log_setup.py
+
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from metrics import registry
+
+LOG_FORMAT = '%(asctime)s %(levelname)s:%(message)s'
+
+_listener = None
+
+registry.describe('log_records_suppressed_total', 'counter', 'Registros de log repetidos suprimidos pela deduplicação.')
+registry.describe('log_records_dropped_total', 'counter', 'Registros de log descartados com a fila de log cheia.')
+
+
+class DedupFilter(logging.Filter):
+    """Deixa passar um aviso/erro repetido por janela de `interval` segundos.
+
+    Registros são considerados repetidos quando vêm da mesma linha de código, do mesmo grupo
+    ou câmera (passados em `extra={'group': ...}` / `extra={'camera': ...}`) e com o mesmo tipo
+    de exceção. O próximo registro depois da janela informa quantos foram suprimidos.
+    Registros abaixo de WARNING não são filtrados.
+    """
+
+    def __init__(self, interval=60.0):
+        super().__init__()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.entries = {}  # chave -> [instante da última emissão, suprimidos desde então]
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.interval <= 0:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.pathname, record.lineno, getattr(record, 'group', None), getattr(record, 'camera', None), exc_type)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                suppressed = True
+            else:
+                repeated = entry[1] if entry is not None else 0
+                self.entries[key] = [now, 0]
+                suppressed = False
+        if suppressed:
+            registry.inc('log_records_suppressed_total')
+            return False
+        if repeated:
+            record.msg = f"{record.msg} (repetido {repeated} vez(es) nos últimos {self.interval:g}s)"
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta o registro com a fila cheia em vez de bloquear quem loga."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            registry.inc('log_records_dropped_total')
+
+
+def setup_logging(log_file, level=logging.INFO, max_bytes=10 * 1024 * 1024, backup_count=5,
+                  dedup_interval=60.0, queue_size=10000):
+    """Configura o logger raiz para enfileirar os registros e gravá-los em uma thread separada.
+
+    As threads de captura e inferência só formatam e enfileiram a mensagem; a escrita no
+    arquivo (com rotação por tamanho) fica com o QueueListener. Retorna o listener.
+    """
+    global _listener
+    stop_logging()  # Chamadas repetidas substituem a configuração anterior
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(DedupFilter(dedup_interval))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def stop_logging():
+    """Para o listener, gravando os registros que ainda estão na fila."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
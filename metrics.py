@@ -0,0 +1,159 @@
+# metrics.py
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites dos buckets em segundos: de 0,5 ms (escrita no ranking) a 5 s (inferência travada)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # O último é o bucket +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histogramas, contadores e gauges em memória, exportados no formato texto do Prometheus.
+
+    As séries são identificadas pelo nome da métrica e pelos rótulos (ex.: group e stage).
+    Valores que já existem em outros componentes (filas, cache, pré-filtro de movimento) são
+    lidos só na hora da coleta, por funções registradas com `add_collector`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = {}  # nome -> {'type', 'help', 'series': {rótulos: valor ou Histogram}}
+        self.collectors = []
+
+    def describe(self, name, metric_type, help_text):
+        with self.lock:
+            family = self.families.setdefault(name, {'series': {}})
+            family['type'] = metric_type
+            family['help'] = help_text
+
+    def _series(self, name, metric_type, labels):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = {'type': metric_type, 'help': name, 'series': {}}
+        return family['series'], tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, 'histogram', labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            series, key = self._series(name, 'counter', labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, 'gauge', labels)
+            series[key] = value
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Mede o bloco e registra a duração no histograma `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector):
+        """Registra uma função que retorna (nome, rótulos, valor) no momento da coleta."""
+        self.collectors.append(collector)
+
+    def render(self):
+        collected = {}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                collected.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+        lines = []
+        with self.lock:
+            names = sorted(set(self.families) | set(collected))
+            for name in names:
+                family = self.families.get(name, {'type': 'gauge', 'help': name, 'series': {}})
+                series = dict(family['series'])
+                series.update(collected.get(name, {}))
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {family['help']}")
+                lines.append(f"# TYPE {name} {family['type']}")
+                for labels in sorted(series):
+                    value = series[labels]
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                            cumulative += count
+                            lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+                        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                        lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+                    else:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+registry.describe('pipeline_stage_seconds', 'histogram',
+                  'Duração de cada etapa do processamento ao vivo por grupo (queue, inference, render, encode, capture_write, ranking_write).')
+registry.describe('camera_stage_seconds', 'histogram', 'Duração da busca e da decodificação dos quadros por câmera.')
+registry.describe('lock_wait_seconds', 'histogram', 'Tempo de espera para adquirir os locks globais do app.')
+registry.describe('frames_total', 'counter', 'Quadros por grupo e resultado (inferred, skipped, dropped).')
+registry.describe('camera_errors_total', 'counter', 'Falhas de busca ou decodificação por câmera.')
+
+
+class TimedLock:
+    """Envolve um Lock/RLock e registra o tempo de espera de cada aquisição em `lock_wait_seconds`."""
+
+    def __init__(self, lock, name):
+        self._lock = lock
+        self.name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        registry.observe('lock_wait_seconds', time.perf_counter() - start, lock=self.name)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -3,27 +3,238 @@
 import torch
 import os
 import sys
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from onnx_backend import export_onnx, quantize_onnx, OnnxYoloModel
+
+
+def _model_size_bytes(model):
+    """Estimativa da memória residente do modelo: parâmetros + buffers."""
+    if isinstance(model, OnnxYoloModel):
+        return model.nbytes
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
 
 class ModelCache:
-    _cache = {}
+    """Cache LRU de modelos limitado por memória.
+
+    A chave é o hash SHA-256 do conteúdo do arquivo (recalculado só quando mtime/tamanho
+    mudam), então reenviar `models/<grupo>/model.pt` no mesmo caminho invalida o modelo
+    antigo. Modelos fixados (`pin`) pelos processadores ao vivo nunca são removidos.
+    Com um perfil de inferência configurado, o modelo é preparado para o modo do perfil
+    (fp32 ou channels_last) logo após o carregamento, e o modo faz parte da chave.
+    Com o backend 'onnx', o .pt é exportado uma vez para models/<grupo>/model.onnx (e, no
+    modo int8, quantizado para model.int8.onnx) e o modelo em cache é um OnnxYoloModel com a
+    mesma interface de resultados.
+    """
+
+    max_bytes = 1024 * 1024 * 1024
+    profile = None
+    _cache = OrderedDict()  # (hash do conteúdo, modo) -> {'model', 'bytes', 'pins', 'path'}
+    _hashes = {}  # caminho -> (mtime_ns, tamanho, hash)
+    _lock = threading.RLock()
+    _stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @classmethod
+    def configure(cls, max_bytes=None, profile=None):
+        with cls._lock:
+            if max_bytes is not None:
+                cls.max_bytes = int(max_bytes)
+            if profile is not None:
+                cls.profile = profile
+                ModelLoader.warmup_size = profile.input_size
+            cls._evict()
+
+    @classmethod
+    def _resolve_path(cls, model_path):
+        # Verifica se o caminho do modelo é absoluto ou relativo
+        if not os.path.isabs(model_path):
+            # Torna o caminho absoluto baseado no diretório do app.py
+            base_path = os.path.dirname(os.path.abspath(__file__))
+            model_path = os.path.join(base_path, model_path)
+        return model_path
+
+    @classmethod
+    def _content_hash(cls, model_path):
+        stat = os.stat(model_path)
+        cached = cls._hashes.get(model_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        cls._hashes[model_path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
 
     @classmethod
     def get_model(cls, model_path):
-        if model_path in cls._cache:
-            return cls._cache[model_path]
-        else:
-            try:
-                # Verifica se o caminho do modelo é absoluto ou relativo
-                if not os.path.isabs(model_path):
-                    # Torna o caminho absoluto baseado no diretório do app.py
-                    base_path = os.path.dirname(os.path.abspath(__file__))
-                    model_path = os.path.join(base_path, model_path)
-                
+        try:
+            model_path = cls._resolve_path(model_path)
+            with cls._lock:
+                content_hash = cls._content_hash(model_path)
+                backend = cls.profile.backend if cls.profile else 'torch'
+                key = (content_hash, backend, cls.profile.mode if cls.profile else 'fp32')
+                entry = cls._cache.get(key)
+                if entry is not None:
+                    cls._cache.move_to_end(key)
+                    cls._stats['hits'] += 1
+                    return entry['model']
+                cls._stats['misses'] += 1
+
+            if backend == 'onnx':
+                onnx_path, meta = export_onnx(model_path, content_hash, cls.profile.input_size)
+                if cls.profile.mode == 'int8':
+                    onnx_path = quantize_onnx(onnx_path, meta)
+                model = OnnxYoloModel(onnx_path, meta['names'], meta['input_size'], cls.profile.num_threads)
+            else:
                 # Carrega o modelo customizado usando torch.hub.load
                 model = torch.hub.load('yolov5', 'custom', path=model_path, source='local')  # 'local' usa o repositório clonado
                 model.eval()
-                cls._cache[model_path] = model
-                return model
-            except Exception as e:
-                print(f"Erro ao carregar o modelo: {e}")
-                return None
+                if cls.profile is not None:
+                    model = cls.profile.apply(model)
+
+            with cls._lock:
+                entry = cls._cache.get(key)
+                if entry is None:
+                    entry = cls._cache[key] = {
+                        'model': model, 'bytes': _model_size_bytes(model), 'pins': 0, 'path': model_path
+                    }
+                cls._cache.move_to_end(key)
+                cls._evict()
+                return entry['model']
+        except Exception as e:
+            print(f"Erro ao carregar o modelo: {e}")
+            return None
+
+    @classmethod
+    def _find_key(cls, model):
+        for key, entry in cls._cache.items():
+            if entry['model'] is model:
+                return key
+        return None
+
+    @classmethod
+    def pin(cls, model):
+        """Impede a remoção do modelo enquanto um processador ao vivo o estiver usando."""
+        with cls._lock:
+            key = cls._find_key(model)
+            if key is not None:
+                cls._cache[key]['pins'] += 1
+
+    @classmethod
+    def unpin(cls, model):
+        with cls._lock:
+            key = cls._find_key(model)
+            if key is not None:
+                entry = cls._cache[key]
+                entry['pins'] = max(0, entry['pins'] - 1)
+                cls._evict()
+
+    @classmethod
+    def _evict(cls):
+        """Remove os modelos menos usados recentemente até caber no orçamento de memória."""
+        resident = sum(entry['bytes'] for entry in cls._cache.values())
+        for key in list(cls._cache.keys()):
+            if resident <= cls.max_bytes:
+                break
+            entry = cls._cache[key]
+            if entry['pins'] > 0:
+                continue
+            del cls._cache[key]
+            resident -= entry['bytes']
+            cls._stats['evictions'] += 1
+            logging.info(f"Modelo removido do cache (LRU): {entry['path']}")
+        if resident > cls.max_bytes:
+            logging.warning("Modelos fixados excedem o orçamento de memória do cache de modelos.")
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                'hits': cls._stats['hits'],
+                'misses': cls._stats['misses'],
+                'evictions': cls._stats['evictions'],
+                'entries': len(cls._cache),
+                'pinned': sum(1 for entry in cls._cache.values() if entry['pins'] > 0),
+                'resident_bytes': sum(entry['bytes'] for entry in cls._cache.values()),
+                'max_bytes': cls.max_bytes,
+            }
+
+
+class ModelLoader:
+    """Carrega modelos em segundo plano, sem bloquear as rotas.
+
+    Pedidos simultâneos para o mesmo arquivo compartilham um único carregamento (single-flight).
+    Depois de carregado, o modelo passa por uma inferência de aquecimento com um tensor vazio,
+    para que o primeiro quadro ao vivo não pague a inicialização preguiçosa do PyTorch.
+    O status de cada grupo ('loading', 'ready' ou 'failed') fica disponível em `status()`.
+    """
+
+    warmup_size = 640
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='model-loader')
+    _inflight = {}  # caminho do modelo -> Future
+    _status = {}  # grupo -> {'status': ..., 'error': ...}
+    _warmed = weakref.WeakSet()  # Modelos já aquecidos (acertos no cache não repetem o aquecimento)
+    _lock = threading.RLock()
+
+    @classmethod
+    def _load_and_warm_up(cls, model_path):
+        model = ModelCache.get_model(model_path)
+        if model is None:
+            raise RuntimeError(f"Falha ao carregar o modelo a partir de '{model_path}'")
+        if model not in cls._warmed:
+            with torch.no_grad():
+                model(torch.zeros(1, 3, cls.warmup_size, cls.warmup_size))
+            cls._warmed.add(model)
+            logging.info(f"Modelo carregado e aquecido: {model_path}")
+        return model
+
+    @classmethod
+    def load_async(cls, group_name, model_path):
+        """Retorna um Future com o modelo do grupo, reaproveitando um carregamento em andamento."""
+        with cls._lock:
+            cls._status[group_name] = {'status': 'loading', 'error': None}
+            future = cls._inflight.get(model_path)
+            if future is None:
+                future = cls._executor.submit(cls._load_and_warm_up, model_path)
+                cls._inflight[model_path] = future
+                future.add_done_callback(lambda f: cls._finish(model_path, f))
+        future.add_done_callback(lambda f: cls._update_status(group_name, f))
+        return future
+
+    @classmethod
+    def _finish(cls, model_path, future):
+        with cls._lock:
+            if cls._inflight.get(model_path) is future:
+                del cls._inflight[model_path]
+
+    @classmethod
+    def _update_status(cls, group_name, future):
+        error = future.exception()
+        with cls._lock:
+            if error is None:
+                cls._status[group_name] = {'status': 'ready', 'error': None}
+            else:
+                cls._status[group_name] = {'status': 'failed', 'error': str(error)}
+                logging.error(f"Erro ao carregar o modelo para o grupo '{group_name}': {error}")
+
+    @classmethod
+    def set_failed(cls, group_name, error):
+        with cls._lock:
+            cls._status[group_name] = {'status': 'failed', 'error': error}
+
+    @classmethod
+    def status(cls, group_name):
+        with cls._lock:
+            return dict(cls._status.get(group_name, {'status': 'unknown', 'error': None}))
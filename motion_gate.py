@@ -0,0 +1,77 @@
+# motion_gate.py
+
+import time
+import threading
+
+import cv2
+
+
+class MotionGate:
+    """Pré-filtro barato que evita rodar o detector quando a cena não mudou.
+
+    Compara uma versão reduzida em tons de cinza do quadro com a do último quadro que passou
+    pela inferência. Se os bytes do JPEG forem idênticos, ou se a diferença média ficar abaixo
+    de `threshold` (níveis de cinza, 0 desativa), as detecções anteriores são reaproveitadas.
+    A cada `max_skip_seconds` a inferência é refeita mesmo com a cena parada.
+    """
+
+    def __init__(self, threshold=2.0, max_skip_seconds=5.0, size=(64, 48)):
+        self.threshold = float(threshold)
+        self.max_skip_seconds = float(max_skip_seconds)
+        self.size = size
+        self.reference = None
+        self.reference_hash = None
+        self.last_inference_time = 0.0
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.skipped_identical = 0
+        self.skipped_static = 0
+
+    def _thumbnail(self, img):
+        # Subamostragem por fatiamento antes do resize: custo quase nulo mesmo em cam-hi
+        small = cv2.resize(img[::4, ::4], self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def should_infer(self, img, raw_hash=None, force=False):
+        """Retorna False quando o quadro pode reaproveitar as detecções anteriores."""
+        now = time.time()
+        with self.lock:
+            self.frames += 1
+            stale = now - self.last_inference_time >= self.max_skip_seconds
+            if not force and not stale:
+                if raw_hash is not None and raw_hash == self.reference_hash:
+                    self.skipped_identical += 1
+                    return False
+                if self.threshold > 0 and self.reference is not None:
+                    small = self._thumbnail(img)
+                    if cv2.absdiff(small, self.reference).mean() < self.threshold:
+                        self.skipped_static += 1
+                        return False
+                    self.reference = small
+                    self.reference_hash = raw_hash
+                    self.last_inference_time = now
+                    return True
+
+            self.reference = self._thumbnail(img) if self.threshold > 0 else None
+            self.reference_hash = raw_hash
+            self.last_inference_time = now
+            return True
+
+    def reset(self):
+        with self.lock:
+            self.reference = None
+            self.reference_hash = None
+            self.last_inference_time = 0.0
+
+    def stats(self):
+        with self.lock:
+            skipped = self.skipped_identical + self.skipped_static
+            return {
+                'frames': self.frames,
+                'inferred': self.frames - skipped,
+                'skipped_identical': self.skipped_identical,
+                'skipped_static': self.skipped_static,
+                'skip_rate': skipped / self.frames if self.frames else 0.0,
+            }
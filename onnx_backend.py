@@ -0,0 +1,190 @@
+# onnx_backend.py
+
+import os
+import json
+import logging
+
+import cv2
+import numpy as np
+
+from preprocessing import draw_detections
+
+# Mesmos limiares padrão do AutoShape do YOLOv5
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 1000
+MAX_WH = 7680  # Deslocamento por classe para o NMS de todas as classes de uma vez
+
+
+def onnx_paths(model_path):
+    """Artefato ONNX e metadados ficam ao lado do .pt: models/<grupo>/model.onnx e model.onnx.json."""
+    onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    return onnx_path, onnx_path + '.json'
+
+
+def export_onnx(model_path, content_hash, input_size):
+    """Exporta o .pt para ONNX uma única vez; reexporta só se o .pt ou o tamanho de entrada mudarem.
+
+    O eixo do lote é dinâmico, para que uma lista de imagens rode em um único `session.run`.
+    """
+    onnx_path, meta_path = onnx_paths(model_path)
+    if os.path.exists(onnx_path) and os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if (meta.get('source_sha256') == content_hash and meta.get('input_size') == input_size
+                and meta.get('dynamic_batch')):
+            return onnx_path, meta
+
+    import torch
+
+    logging.info(f"Exportando {model_path} para ONNX ({input_size}x{input_size}).")
+    autoshape = torch.hub.load('yolov5', 'custom', path=model_path, source='local')
+    detection_model = autoshape.model.model  # AutoShape -> DetectMultiBackend -> DetectionModel
+    detection_model.float().eval()
+    for module in detection_model.modules():
+        if type(module).__name__ in ('Detect', 'Segment'):
+            module.export = True  # Saída única (lote, N, 5 + classes), como no export.py do YOLOv5
+
+    dummy = torch.zeros(1, 3, input_size, input_size)
+    tmp_path = onnx_path + '.tmp'
+    with torch.no_grad():
+        torch.onnx.export(detection_model, dummy, tmp_path, opset_version=12,
+                          input_names=['images'], output_names=['output0'],
+                          dynamic_axes={'images': {0: 'batch'}, 'output0': {0: 'batch'}})
+    os.replace(tmp_path, onnx_path)
+
+    names = autoshape.names
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+    meta = {'source_sha256': content_hash, 'input_size': input_size, 'names': list(names), 'dynamic_batch': True}
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    return onnx_path, meta
+
+
+def quantize_onnx(onnx_path, meta):
+    """Gera uma cópia int8 do modelo ONNX (modo 'int8') e retorna o caminho dela.
+
+    A quantização dinâmica do onnxruntime troca as convoluções por ConvInteger, com pesos em
+    uint8 e ativações quantizadas em tempo de execução, sem precisar de imagens de calibração.
+    A cópia é refeita quando o model.onnx é exportado de novo (a exportação regrava os metadados).
+    """
+    int8_path = os.path.splitext(onnx_path)[0] + '.int8.onnx'
+    if os.path.exists(int8_path) and meta.get('int8'):
+        return int8_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logging.info(f"Quantizando {onnx_path} para int8.")
+    tmp_path = int8_path + '.tmp'
+    quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QUInt8)
+    os.replace(tmp_path, int8_path)
+    meta['int8'] = True
+    with open(onnx_path + '.json', 'w') as f:
+        json.dump(meta, f, indent=4)
+    return int8_path
+
+
+def letterbox(img, size, color=(114, 114, 114)):
+    """Redimensiona mantendo a proporção e completa com bordas até `size` x `size`."""
+    height, width = img.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_w, pad_h = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, ratio, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """NMS guloso com IoU vetorizado em numpy; retorna os índices mantidos em ordem de score."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(prediction, conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD, max_det=MAX_DETECTIONS):
+    """Converte a saída bruta (N, 5 + classes) em linhas xyxy, confiança, classe (como results.xyxy[0])."""
+    prediction = prediction[prediction[:, 4] > conf_threshold]
+    if not len(prediction):
+        return np.zeros((0, 6), dtype=np.float32)
+    class_scores = prediction[:, 5:] * prediction[:, 4:5]
+    class_ids = class_scores.argmax(axis=1)
+    confidences = class_scores[np.arange(len(class_scores)), class_ids]
+    mask = confidences > conf_threshold
+    prediction, class_ids, confidences = prediction[mask], class_ids[mask], confidences[mask]
+    if not len(prediction):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    xy, wh = prediction[:, :2], prediction[:, 2:4] / 2
+    boxes = np.concatenate((xy - wh, xy + wh), axis=1)
+    # Desloca as caixas por classe para fazer o NMS de todas as classes em uma única chamada
+    keep = nms(boxes + class_ids[:, None] * MAX_WH, confidences, iou_threshold)[:max_det]
+    return np.concatenate(
+        (boxes[keep], confidences[keep, None], class_ids[keep, None].astype(np.float32)), axis=1
+    ).astype(np.float32)
+
+
+class OnnxDetections:
+    """Resultado no mesmo formato consumido pelo app: `xyxy[i]`, `names` e `render()`."""
+
+    def __init__(self, ims, xyxy, names):
+        self.ims = ims
+        self.xyxy = xyxy
+        self.names = names
+
+    def render(self):
+        self.ims = [draw_detections(img.copy(), det, self.names) for img, det in zip(self.ims, self.xyxy)]
+        return self.ims
+
+
+class OnnxYoloModel:
+    """Executa um YOLOv5 exportado para ONNX com o onnxruntime em CPU."""
+
+    def __init__(self, onnx_path, names, input_size, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = names
+        self.input_size = input_size
+        self.nbytes = os.path.getsize(onnx_path)
+
+    def eval(self):
+        return self
+
+    def __call__(self, img, size=None):
+        if not isinstance(img, (list, tuple, np.ndarray)):
+            # Tensor já pré-processado (N, 3, H, W), como no AutoShape; usado no aquecimento
+            return self.session.run(None, {self.input_name: img.numpy().astype(np.float32)})[0]
+
+        # Imagem única ou lista de imagens, como no AutoShape; o lote inteiro vai em um único session.run
+        ims = list(img) if isinstance(img, (list, tuple)) else [img]
+        boxed = [letterbox(im[..., :3], self.input_size) for im in ims]
+        blob = np.stack([b.transpose(2, 0, 1) for b, _, _ in boxed]).astype(np.float32) / 255.0
+        predictions = self.session.run(None, {self.input_name: blob})[0]
+        xyxy = []
+        for im, (_, ratio, (pad_x, pad_y)), prediction in zip(ims, boxed, predictions):
+            detections = postprocess(prediction)
+            # Volta as caixas para as coordenadas da imagem original
+            detections[:, [0, 2]] = np.clip((detections[:, [0, 2]] - pad_x) / ratio, 0, im.shape[1])
+            detections[:, [1, 3]] = np.clip((detections[:, [1, 3]] - pad_y) / ratio, 0, im.shape[0])
+            xyxy.append(detections)
+        return OnnxDetections(ims, xyxy, self.names)
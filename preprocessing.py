@@ -0,0 +1,87 @@
+# preprocessing.py
+
+import cv2
+import numpy as np
+
+JPEG_SOI = b'\xff\xd8'
+# Marcadores SOF (início de quadro) que trazem as dimensões do JPEG; C4, C8 e CC não são SOF
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def jpeg_dimensions(data):
+    """Lê (largura, altura) do cabeçalho do JPEG sem decodificar a imagem; None se não for um JPEG válido."""
+    view = memoryview(data).cast('B')
+    size = len(view)
+    if bytes(view[:2]) != JPEG_SOI:
+        return None  # PNG, BMP etc.: bytes quaisquer poderiam parecer um cabeçalho SOF
+    i = 2  # Depois do SOI
+    while i + 9 <= size:
+        if view[i] != 0xFF:
+            i += 1
+            continue
+        marker = view[i + 1]
+        if marker == 0xFF:
+            i += 1  # Bytes de preenchimento
+            continue
+        if marker in _SOF_MARKERS:
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return width, height
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2  # Marcadores sem segmento
+            continue
+        if marker == 0xDA:
+            return None  # Início dos dados comprimidos sem nenhum SOF antes
+        length = (view[i + 2] << 8) | view[i + 3]
+        if length < 2 or i + 2 + length > size:
+            return None  # Segmento truncado ou corrompido
+        i += 2 + length
+    return None
+
+
+def decode_frame(data, decode_size=None):
+    """Decodifica o JPEG na menor escala (1/2, 1/4 ou 1/8) cujo lado maior ainda cobre `decode_size`.
+
+    O libjpeg reduz a imagem durante a decodificação (IDCT em escala), o que custa bem menos
+    que decodificar em resolução cheia para o modelo redimensionar logo em seguida.
+    Retorna (imagem, escala), onde escala é o fator de volta para a resolução original.
+    """
+    flag, scale = cv2.IMREAD_COLOR, 1
+    if decode_size:
+        dimensions = jpeg_dimensions(data)
+        if dimensions is not None:
+            longest = max(dimensions)
+            for factor, reduced_flag in _REDUCED_FLAGS:
+                if longest // factor >= decode_size:
+                    flag, scale = reduced_flag, factor
+                    break
+    img = cv2.imdecode(data, flag)
+    if img is None:
+        raise ValueError("Falha ao decodificar a imagem da câmera")
+    return img, scale
+
+
+def full_resolution_image(jpeg, image, scale):
+    """Imagem em resolução cheia para salvar: decodifica o JPEG de novo só se o quadro foi reduzido."""
+    if scale == 1 or jpeg is None:
+        return image.copy()
+    img = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return img if img is not None else image.copy()
+
+
+def draw_detections(img, detections, names, scale=1.0):
+    """Desenha caixas e rótulos (linhas xyxy, confiança, classe) em `img`, ajustando pela escala."""
+    for x1, y1, x2, y2, conf, cls in detections:
+        label = f"{names[int(cls)]} {conf:.2f}"
+        p1 = (int(x1 * scale), int(y1 * scale))
+        p2 = (int(x2 * scale), int(y2 * scale))
+        thickness = max(2, int(round(scale)))
+        cv2.rectangle(img, p1, p2, (56, 56, 255), thickness, lineType=cv2.LINE_AA)
+        cv2.putText(img, label, (p1[0], max(p1[1] - 4, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5 * thickness / 2,
+                    (255, 255, 255), max(1, thickness // 2), lineType=cv2.LINE_AA)
+    return img
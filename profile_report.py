@@ -0,0 +1,150 @@
+# profile_report.py
+"""Relatório comparativo dos modos de inferência em CPU (fp32, channels_last, int8).
+
+Roda o mesmo modelo em cada configuração sobre uma pasta de imagens e mede o FPS e o desvio
+das detecções em relação ao fp32 do PyTorch (mAP@0.5 usando essas detecções como referência).
+O int8 roda no onnxruntime, então o fp32 do ONNX também entra no relatório para separar o
+ganho da quantização do ganho da troca de backend.
+
+    python profile_report.py --model "models/grupo 1/model.pt" --images pasta_de_imagens --output relatorio.md
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+import torch
+
+from inference_profile import InferenceProfile
+from model_cache import ModelCache
+
+# (backend, modo) comparados no relatório; a primeira é a referência
+CONFIGURATIONS = (('torch', 'fp32'), ('torch', 'channels_last'), ('onnx', 'fp32'), ('onnx', 'int8'))
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_images(images_dir, limit):
+    filenames = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    images = [cv2.imread(os.path.join(images_dir, f)) for f in filenames]
+    return [img for img in images if img is not None]
+
+
+def _iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def mean_average_precision(predictions, references, iou_threshold=0.5):
+    """mAP das predições contra as referências; ambas são listas (por imagem) de arrays Nx6 xyxy/conf/classe."""
+    classes = set()
+    for ref in references:
+        classes.update(int(c) for c in ref[:, 5])
+    if not classes:
+        return 1.0
+
+    aps = []
+    for cls in classes:
+        refs = [ref[ref[:, 5] == cls] for ref in references]
+        total_refs = sum(len(r) for r in refs)
+        matched = [np.zeros(len(r), dtype=bool) for r in refs]
+        preds = [(i, det) for i, pred in enumerate(predictions) for det in pred[pred[:, 5] == cls]]
+        preds.sort(key=lambda item: item[1][4], reverse=True)
+
+        tp = np.zeros(len(preds))
+        for n, (i, det) in enumerate(preds):
+            if len(refs[i]) == 0:
+                continue
+            ious = _iou(det[:4], refs[i][:, :4])
+            best = int(np.argmax(ious))
+            if ious[best] >= iou_threshold and not matched[i][best]:
+                matched[i][best] = True
+                tp[n] = 1
+
+        tp_cum = np.cumsum(tp)
+        recall = tp_cum / max(total_refs, 1)
+        precision = tp_cum / np.arange(1, len(preds) + 1) if preds else np.array([])
+        # Interpolação por todos os pontos (como no VOC 2010+)
+        mrec = np.concatenate(([0.0], recall, [1.0]))
+        mpre = np.concatenate(([1.0], precision, [0.0]))
+        mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+        steps = np.where(mrec[1:] != mrec[:-1])[0]
+        aps.append(float(np.sum((mrec[steps + 1] - mrec[steps]) * mpre[steps + 1])))
+    return float(np.mean(aps))
+
+
+def run_mode(model_path, backend, mode, images, input_size, num_threads):
+    profile = InferenceProfile(mode=mode, input_size=input_size, num_threads=num_threads, backend=backend)
+    profile.rebalance_threads(1, 1)
+    # Mesmo caminho de carregamento do app (exportação e quantização ONNX incluídas)
+    ModelCache.configure(profile=profile)
+    model = ModelCache.get_model(model_path)
+    if model is None:
+        raise RuntimeError(f"Falha ao carregar {model_path} em {backend}/{mode}")
+
+    profile.run(model, images[0])  # Aquecimento fora da medição
+    detections = []
+    start = time.perf_counter()
+    for img in images:
+        results = profile.run(model, img)
+        xyxy = results.xyxy[0]
+        detections.append(xyxy.cpu().numpy() if hasattr(xyxy, 'cpu') else np.asarray(xyxy))
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara FPS e desvio de mAP dos modos de inferência em CPU.")
+    parser.add_argument('--model', required=True, help="Caminho do model.pt do grupo")
+    parser.add_argument('--images', required=True, help="Pasta com imagens de avaliação")
+    parser.add_argument('--input-size', type=int, default=640)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--limit', type=int, default=200, help="Número máximo de imagens")
+    parser.add_argument('--output', default='profile_report.md')
+    args = parser.parse_args()
+
+    yolov5_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5')
+    if yolov5_path not in sys.path:
+        sys.path.insert(0, yolov5_path)
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        parser.error(f"Nenhuma imagem encontrada em {args.images}")
+
+    results = {}
+    for backend, mode in CONFIGURATIONS:
+        print(f"Executando {backend}/{mode}...")
+        results[(backend, mode)] = run_mode(args.model, backend, mode, images, args.input_size, args.threads)
+
+    reference_fps, reference = results[CONFIGURATIONS[0]]
+    lines = [
+        '# Relatório de modos de inferência',
+        '',
+        f'- Modelo: `{args.model}`',
+        f'- Imagens: {len(images)} de `{args.images}`',
+        f'- Tamanho de entrada: {args.input_size}',
+        f'- Threads: {torch.get_num_threads()}',
+        '',
+        '| Backend | Modo | FPS | Ganho vs torch/fp32 | mAP@0.5 vs torch/fp32 | Desvio |',
+        '|---------|------|-----|---------------------|-----------------------|--------|',
+    ]
+    for (backend, mode), (fps, detections) in results.items():
+        map50 = mean_average_precision(detections, reference)
+        lines.append(f'| {backend} | {mode} | {fps:.2f} | {fps / reference_fps:.2f}x | {map50:.4f} | {1.0 - map50:.4f} |')
+
+    with open(args.output, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+# ranking_store.py
+
+import os
+import json
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+import logging
+
+from metrics import registry
+
+
+def _confidence_key(img_info):
+    return img_info.get('confidence') or 0.0
+
+
+def best_detection(detections, names):
+    """Classe e confiança da detecção mais confiável (linhas xyxy, confiança, classe); None se vazio.
+
+    É a detecção que entra no ranking, tanto no processamento ao vivo quanto na avaliação offline.
+    """
+    if len(detections) == 0:
+        return None
+    best = detections[detections[:, 4].argmax()]
+    return names[int(best[5])], float(best[4])
+
+
+class TopKTracker:
+    """Mantém as k melhores imagens de um grupo em um min-heap limitado.
+
+    Inserções custam O(log k) e a soma das confianças do top-k é atualizada incrementalmente,
+    de modo que a acurácia não exige reordenar todas as imagens do grupo. Em empates de
+    confiança prevalece a imagem capturada primeiro, como na ordenação estável anterior.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []  # (confiança, -sequência, img_info); o topo é a pior imagem do top-k
+        self.filenames = set()
+        self.total = 0.0
+        self.counter = itertools.count()
+        self.top_images = []
+        self.accuracy = 0.0
+
+    def _refresh(self):
+        self.top_images = [entry[2] for entry in sorted(self.heap, reverse=True)]
+        self.accuracy = self.total / len(self.heap) if self.heap else 0.0
+
+    def add(self, img_info):
+        key = _confidence_key(img_info)
+        entry = (key, -next(self.counter), img_info)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif key > self.heap[0][0]:
+            evicted = heapq.heapreplace(self.heap, entry)
+            self.filenames.discard(evicted[2]['image_filename'])
+            self.total -= evicted[0]
+        else:
+            return
+        self.filenames.add(img_info['image_filename'])
+        self.total += key
+        self._refresh()
+
+    def contains(self, image_filename):
+        return image_filename in self.filenames
+
+    def rebuild(self, images):
+        """Reconstrói o top-k a partir das imagens já ordenadas por confiança (ou de qualquer iterável)."""
+        self.heap = []
+        self.filenames = set()
+        self.total = 0.0
+        self.top_images = []
+        self.accuracy = 0.0
+        for img_info in images:
+            self.add(img_info)
+
+
+class RankingStore:
+    """Persistência do ranking em SQLite (modo WAL) com índice em memória por grupo.
+
+    Cada imagem adicionada ou removida é uma única escrita no banco, em vez de reescrever o
+    ranking inteiro. O índice em memória guarda, por grupo, as imagens (na ordem de captura)
+    e um TopKTracker com as melhores imagens e a acurácia.
+    """
+
+    TOP_K = 3
+
+    def __init__(self, db_path, lock=None):
+        self.db_path = db_path
+        self.lock = lock or threading.RLock()
+        self.groups = {}
+        self.connection = None
+        # Versão incrementada a cada alteração; usada para o leaderboard materializado e ETags.
+        # Parte do relógio para que ETags de uma execução anterior não coincidam com as novas.
+        self.version = int(time.time() * 1000)
+        self._leaderboard = []
+        self._leaderboard_version = -1
+        self._data_version = None  # PRAGMA data_version da última leitura do índice
+        # Últimas linhas já aplicadas ao índice, para que sync() leia só o que veio depois
+        self._last_group_rowid = 0
+        self._last_image_id = 0
+        self._last_deletion_id = 0
+
+    def open(self):
+        with self.lock:
+            if self.connection is not None:
+                return
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=FULL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS images ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'group_name TEXT NOT NULL, '
+                'image_filename TEXT NOT NULL, '
+                'class TEXT, '
+                'confidence REAL, '
+                'UNIQUE (group_name, image_filename))'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS images_by_confidence ON images (group_name, confidence DESC)'
+            )
+            self.connection.execute('CREATE TABLE IF NOT EXISTS groups (group_name TEXT PRIMARY KEY)')
+            # Registro das remoções, lido pelos outros processos em sync(); substituições não
+            # precisam dele porque a linha nova recebe um id maior
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS deleted_images ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'group_name TEXT NOT NULL, '
+                'image_filename TEXT NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS images_deleted AFTER DELETE ON images BEGIN '
+                'INSERT INTO deleted_images (group_name, image_filename) VALUES (OLD.group_name, OLD.image_filename); '
+                'END'
+            )
+            self.connection.commit()
+            self._load_index()
+            logging.info(f"Ranking carregado de {self.db_path}: {len(self.groups)} grupo(s).")
+
+    def _load_index(self):
+        self.groups = {}
+        self._last_group_rowid = 0
+        self._last_image_id = 0
+        # A versão é lida antes dos dados: um commit no meio só provoca um sync() a mais
+        self._data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        self.connection.execute('BEGIN')  # Leitura em um único snapshot do WAL
+        try:
+            self._load_groups()
+            for row in self.connection.execute(
+                'SELECT id, group_name, image_filename, class, confidence FROM images ORDER BY id'
+            ):
+                self._last_image_id, group_name, image_filename, class_name, confidence = row
+                img_info = {'image_filename': image_filename, 'class': class_name, 'confidence': confidence}
+                group = self._group(group_name)
+                group['images'][image_filename] = img_info
+                group['ids'][image_filename] = self._last_image_id
+                group['top'].add(img_info)
+            self._last_deletion_id = self.connection.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM deleted_images'
+            ).fetchone()[0]
+        finally:
+            self.connection.commit()
+        self.version += 1
+
+    def _load_groups(self):
+        for rowid, group_name in self.connection.execute(
+            'SELECT rowid, group_name FROM groups WHERE rowid > ? ORDER BY rowid', (self._last_group_rowid,)
+        ):
+            self._last_group_rowid = rowid
+            self._group(group_name)
+
+    def sync(self):
+        """Aplica ao índice o que outros processos gravaram no banco (workers de grupo, avaliação offline).
+
+        `PRAGMA data_version` só muda com commits de outras conexões, então a verificação custa
+        uma consulta trivial e as escritas deste processo não provocam leitura. Quando muda, só
+        são lidas as linhas posteriores às já vistas: imagens com id maior (inserções e
+        substituições) e entradas novas de deleted_images; o top-k é refeito apenas nos grupos
+        em que uma imagem do top-k foi substituída ou removida.
+        """
+        with self.lock:
+            data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            self.connection.execute('BEGIN')
+            try:
+                changed = self._sync_changes()
+            finally:
+                self.connection.commit()
+            if changed:
+                self.version += 1
+
+    def _sync_changes(self):
+        changed = False
+        stale = {}  # grupos cujo top-k precisa ser refeito
+        self._load_groups()
+        rows = self.connection.execute(
+            'SELECT id, group_name, image_filename, class, confidence FROM images WHERE id > ? ORDER BY id',
+            (self._last_image_id,)
+        ).fetchall()
+        for row_id, group_name, image_filename, class_name, confidence in rows:
+            self._last_image_id = row_id
+            group = self._group(group_name)
+            if group['ids'].get(image_filename) == row_id:
+                continue  # Escrita deste próprio processo
+            img_info = {'image_filename': image_filename, 'class': class_name, 'confidence': confidence}
+            group['images'].pop(image_filename, None)
+            group['images'][image_filename] = img_info
+            group['ids'][image_filename] = row_id
+            # O top-k pode já ter a imagem mesmo sem ela estar no índice (lida por _rebuild_top)
+            if group['top'].contains(image_filename):
+                stale[group_name] = group
+            else:
+                group['top'].add(img_info)
+            changed = True
+        deletions = self.connection.execute(
+            'SELECT id, group_name, image_filename FROM deleted_images WHERE id > ? ORDER BY id',
+            (self._last_deletion_id,)
+        ).fetchall()
+        for deletion_id, group_name, image_filename in deletions:
+            self._last_deletion_id = deletion_id
+            group = self.groups.get(group_name)
+            if group is None or image_filename not in group['images']:
+                continue
+            # A imagem pode ter sido gravada de novo depois da remoção (já aplicada acima)
+            if self.connection.execute(
+                'SELECT 1 FROM images WHERE group_name = ? AND image_filename = ?', (group_name, image_filename)
+            ).fetchone() is not None:
+                continue
+            del group['images'][image_filename]
+            group['ids'].pop(image_filename, None)
+            if group['top'].contains(image_filename):
+                stale[group_name] = group
+            changed = True
+        for group in stale.values():
+            self._rebuild_top(group)
+        return changed
+
+    def _group(self, group_name):
+        group = self.groups.get(group_name)
+        if group is None:
+            group = self.groups[group_name] = {
+                'group': group_name,
+                'images': {},  # image_filename -> img_info, na ordem de captura
+                'ids': {},  # image_filename -> id da linha no banco
+                'top': TopKTracker(self.TOP_K)
+            }
+        return group
+
+    def _rebuild_top(self, group):
+        """Recalcula o top-k do grupo usando o índice (group_name, confidence) do banco.
+
+        Um worker pode ter inserido imagens depois do último sync(): linhas que ainda não estão
+        no índice em memória são montadas a partir das próprias colunas.
+        """
+        rows = self.connection.execute(
+            'SELECT image_filename, class, confidence FROM images WHERE group_name = ? ORDER BY confidence DESC, id LIMIT ?',
+            (group['group'], self.TOP_K)
+        )
+        group['top'].rebuild(
+            group['images'].get(image_filename)
+            or {'image_filename': image_filename, 'class': class_name, 'confidence': confidence}
+            for image_filename, class_name, confidence in rows
+        )
+
+    def ensure_group(self, group_name):
+        with self.lock:
+            if group_name not in self.groups:
+                self.connection.execute('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', (group_name,))
+                self.connection.commit()
+                self.version += 1
+            return self._group(group_name)
+
+    def add_image(self, group_name, image_filename, class_name=None, confidence=None):
+        """Registra uma imagem do grupo com uma única inserção no banco."""
+        img_info = {'image_filename': image_filename, 'class': class_name, 'confidence': confidence}
+        with self.lock, registry.time('pipeline_stage_seconds', group=group_name, stage='ranking_write'):
+            with self.connection:
+                self.connection.execute('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', (group_name,))
+                row_id = self.connection.execute(
+                    'INSERT OR REPLACE INTO images (group_name, image_filename, class, confidence) VALUES (?, ?, ?, ?)',
+                    (group_name, image_filename, class_name, confidence)
+                ).lastrowid
+            group = self._group(group_name)
+            group['images'].pop(image_filename, None)
+            group['images'][image_filename] = img_info
+            group['ids'][image_filename] = row_id
+            if group['top'].contains(image_filename):
+                self._rebuild_top(group)
+            else:
+                group['top'].add(img_info)
+            self.version += 1
+        return img_info
+
+    def delete_image(self, group_name, image_filename):
+        """Remove uma imagem do grupo; retorna False se ela não estava no ranking."""
+        with self.lock:
+            self.sync()
+            group = self.groups.get(group_name)
+            if group is None or image_filename not in group['images']:
+                return False
+            with self.connection:
+                self.connection.execute(
+                    'DELETE FROM images WHERE group_name = ? AND image_filename = ?', (group_name, image_filename)
+                )
+            del group['images'][image_filename]
+            group['ids'].pop(image_filename, None)
+            # Só é preciso reconstruir o top-k quando a imagem removida fazia parte dele
+            if group['top'].contains(image_filename):
+                self._rebuild_top(group)
+            self.version += 1
+            return True
+
+    def get_ranking(self):
+        """Resumo de todos os grupos (grupo, acurácia e melhores imagens), sem a lista completa de imagens."""
+        with self.lock:
+            self.sync()
+            return [
+                {'group': group['group'], 'accuracy': group['top'].accuracy, 'top_images': list(group['top'].top_images)}
+                for group in self.groups.values()
+            ]
+
+    def get_leaderboard(self):
+        """Grupos ordenados por acurácia, reconstruído apenas quando o ranking muda.
+
+        A lista retornada é compartilhada entre as requisições e não deve ser alterada.
+        """
+        with self.lock:
+            self.sync()
+            if self._leaderboard_version != self.version:
+                self._leaderboard = sorted(self.get_ranking(), key=lambda x: x['accuracy'], reverse=True)
+                self._leaderboard_version = self.version
+            return self._leaderboard
+
+    def get_group_images(self, group_name):
+        """Retorna (imagens, melhores imagens) do grupo."""
+        with self.lock:
+            self.sync()
+            group = self.groups.get(group_name)
+            if group is None:
+                return [], []
+            return list(group['images'].values()), list(group['top'].top_images)
+
+    def get_group_images_page(self, group_name, offset, limit):
+        """Retorna (imagens da página, total de imagens, melhores imagens) do grupo."""
+        with self.lock:
+            self.sync()
+            group = self.groups.get(group_name)
+            if group is None:
+                return [], 0, []
+            page = list(itertools.islice(group['images'].values(), offset, offset + limit))
+            return page, len(group['images']), list(group['top'].top_images)
+
+    def import_ranking_json(self, json_path):
+        """Importa um ranking.json legado; retorna o número de imagens importadas."""
+        try:
+            with open(json_path, 'r') as f:
+                legacy_data = json.load(f)
+        except json.JSONDecodeError as e:
+            logging.error(f"Erro ao decodificar {json_path}: {e}")
+            return 0
+
+        imported = 0
+        with self.lock:
+            with self.connection:
+                for entry in legacy_data or []:
+                    group_name = entry.get('group')
+                    if not group_name:
+                        continue
+                    self.connection.execute('INSERT OR IGNORE INTO groups (group_name) VALUES (?)', (group_name,))
+                    for img in entry.get('images', []):
+                        self.connection.execute(
+                            'INSERT OR IGNORE INTO images (group_name, image_filename, class, confidence) VALUES (?, ?, ?, ?)',
+                            (group_name, img['image_filename'], img.get('class'), img.get('confidence'))
+                        )
+                        imported += 1
+            self._load_index()
+        logging.info(f"{imported} imagem(ns) importada(s) de {json_path}.")
+        return imported
+
+    def is_empty(self):
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM groups LIMIT 1').fetchone() is None
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+def open_ranking_store(db_path, legacy_json_path=None, lock=None):
+    """Abre o store e, se o banco for novo, importa o ranking.json existente."""
+    store = RankingStore(db_path, lock=lock)
+    store.open()
+    if legacy_json_path and store.is_empty() and os.path.exists(legacy_json_path):
+        store.import_ranking_json(legacy_json_path)
+    return store
@@ -0,0 +1,100 @@
+# rate_controller.py
+
+import time
+import threading
+from collections import deque
+
+
+class RateController:
+    """Controla a taxa de quadros enviados à inferência por um processador ao vivo.
+
+    Substitui o intervalo fixo de 100 ms: a taxa sobe aos poucos até `target_fps` enquanto
+    houver folga e cai multiplicativamente quando a latência (fila + inferência) passa de
+    `latency_budget` segundos, quando a fração de tempo ocupada com inferência passa de
+    `cpu_budget` ou quando o escalonador descarta quadros. Sem ninguém assistindo, o
+    processador cai para `idle_fps` (as capturas continuam, mas sem pressa).
+    """
+
+    def __init__(self, target_fps=10.0, min_fps=1.0, idle_fps=2.0, latency_budget=0.5,
+                 cpu_budget=0.8, adjust_interval=1.0, window=5.0):
+        self.target_fps = max(float(target_fps), 0.1)
+        self.min_fps = min(max(float(min_fps), 0.1), self.target_fps)
+        self.idle_fps = min(max(float(idle_fps), 0.1), self.target_fps)
+        self.latency_budget = float(latency_budget)
+        self.cpu_budget = float(cpu_budget)
+        self.adjust_interval = adjust_interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.current_fps = self.target_fps
+            self.latency = None  # Média móvel exponencial da latência por quadro
+            self.busy = None  # Média móvel exponencial do tempo de inferência por quadro
+            self.dropped = 0
+            self.completed = deque()  # Instantes de conclusão dentro da janela
+            self.started = self.last_adjust = time.time()
+            self.idle = False
+
+    @staticmethod
+    def _ewma(previous, value, alpha=0.3):
+        return value if previous is None else previous + alpha * (value - previous)
+
+    def record(self, latency, busy):
+        """Registra um quadro concluído: latência total desde a captura e tempo efetivo de processamento."""
+        now = time.time()
+        with self.lock:
+            self.latency = self._ewma(self.latency, latency)
+            self.busy = self._ewma(self.busy, busy)
+            self.completed.append(now)
+            self._adjust(now)
+
+    def record_drop(self):
+        """Quadro descartado pelo escalonador: sinal de que a inferência não acompanha a taxa atual."""
+        with self.lock:
+            self.dropped += 1
+            self._adjust(time.time())
+
+    def _adjust(self, now):
+        if now - self.last_adjust < self.adjust_interval:
+            return
+        self.last_adjust = now
+        load = (self.busy or 0.0) * self.current_fps
+        overloaded = (
+            self.dropped > 0
+            or (self.latency is not None and self.latency > self.latency_budget)
+            or load > self.cpu_budget
+        )
+        if overloaded:
+            self.current_fps = max(self.min_fps, self.current_fps * 0.7)
+        elif load < self.cpu_budget * 0.7:
+            self.current_fps = min(self.target_fps, self.current_fps + 1.0)
+        self.dropped = 0
+
+    def interval(self, watched):
+        """Intervalo em segundos até o próximo quadro."""
+        with self.lock:
+            self.idle = not watched
+            fps = self.current_fps if watched else min(self.current_fps, self.idle_fps)
+            return 1.0 / fps
+
+    def effective_fps(self):
+        now = time.time()
+        with self.lock:
+            while self.completed and now - self.completed[0] > self.window:
+                self.completed.popleft()
+            span = min(self.window, now - self.started)
+            return len(self.completed) / span if span > 0 else 0.0
+
+    def stats(self):
+        effective = self.effective_fps()
+        with self.lock:
+            return {
+                'effective_fps': round(effective, 2),
+                'limit_fps': round(min(self.current_fps, self.idle_fps) if self.idle else self.current_fps, 2),
+                'target_fps': self.target_fps,
+                'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'inference_ms': round(self.busy * 1000, 1) if self.busy is not None else None,
+                'idle': self.idle,
+            }
@@ -0,0 +1,123 @@
+# sampling_profiler.py
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+MAX_DURATION = 60.0  # Segundos
+MIN_INTERVAL = 0.001
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+    """Profiler por amostragem de pilhas de threads em execução, sem instrumentar o código.
+
+    A cada `interval` segundos lê as pilhas atuais com `sys._current_frames()` e conta apenas
+    as threads retornadas por `select_threads` naquele instante (a seleção é refeita a cada
+    amostra, pois os workers de inferência e as threads de requisição mudam de tarefa). Nada
+    roda nas threads amostradas, então o custo fica na thread do profiler e cresce só com a
+    frequência de amostragem. Apenas uma sessão por vez, para não somar overhead.
+    """
+
+    _active_lock = threading.Lock()
+
+    def __init__(self, select_threads, interval=0.01):
+        self.select_threads = select_threads  # Função que retorna {ident da thread: rótulo}
+        self.interval = max(float(interval), MIN_INTERVAL)
+        self.stacks = Counter()
+        self.samples = 0
+        self.ticks = 0
+        self.elapsed = 0.0
+        self.sampling_time = 0.0
+        self._labels = {}  # Cache de rótulos por objeto de código
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self):
+        threads = self.select_threads()
+        if not threads:
+            return
+        frames = sys._current_frames()
+        for ident, thread_label in threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_label.replace(';', ','))  # ';' separa os quadros no formato colapsado
+            stack.reverse()  # Da raiz para a folha, como no formato colapsado
+            self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+    def run(self, duration):
+        """Amostra por `duration` segundos na thread atual; retorna False se outra sessão estiver ativa."""
+        if not self._active_lock.acquire(blocking=False):
+            return False
+        try:
+            duration = min(max(float(duration), self.interval), MAX_DURATION)
+            start = time.perf_counter()
+            deadline = start + duration
+            next_tick = start
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                self._sample()
+                self.ticks += 1
+                self.sampling_time += time.perf_counter() - now
+                next_tick += self.interval
+                # Se a amostra atrasou, segue do instante atual em vez de disparar várias seguidas
+                if next_tick < time.perf_counter():
+                    next_tick = time.perf_counter() + self.interval
+                time.sleep(max(0.0, min(next_tick, deadline) - time.perf_counter()))
+            self.elapsed = time.perf_counter() - start
+            return True
+        finally:
+            self._active_lock.release()
+
+    def collapsed(self):
+        """Pilhas no formato colapsado ('raiz;...;folha contagem'), aceito por flamegraph.pl e speedscope."""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def top_functions(self, limit=20):
+        """Funções com mais amostras: 'self' quando estão no topo da pilha, 'total' quando aparecem nela."""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]  # Descarta o rótulo da thread
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for function in set(frames):
+                total[function] += count
+        samples = self.samples or 1
+        return [
+            {
+                'function': function,
+                'self': count,
+                'self_pct': round(100.0 * count / samples, 1),
+                'total': total[function],
+                'total_pct': round(100.0 * total[function] / samples, 1),
+            }
+            for function, count in own.most_common(limit)
+        ]
+
+    def summary(self, limit=20):
+        return {
+            'duration': round(self.elapsed, 3),
+            'interval_ms': round(self.interval * 1000, 2),
+            'ticks': self.ticks,
+            'samples': self.samples,
+            # Fração de uma CPU gasta pelo próprio profiler
+            'overhead_pct': round(100.0 * self.sampling_time / self.elapsed, 2) if self.elapsed else 0.0,
+            'top_functions': self.top_functions(limit),
+            'collapsed': self.collapsed(),
+        }
@@ -0,0 +1,48 @@
+# thumbnails.py
+
+import os
+import logging
+
+import cv2
+
+# Miniaturas ficam em static/captures/<grupo>/thumbs/<arquivo>
+THUMBNAIL_DIRNAME = 'thumbs'
+THUMBNAIL_SIZE = 320
+THUMBNAIL_JPEG_QUALITY = 80
+
+
+def thumbnail_path(capture_path):
+    capture_dir, filename = os.path.split(capture_path)
+    return os.path.join(capture_dir, THUMBNAIL_DIRNAME, filename)
+
+
+def write_thumbnail(frame, capture_path, max_size=THUMBNAIL_SIZE):
+    """Reduz o quadro para caber em `max_size` pixels e grava a miniatura da captura."""
+    height, width = frame.shape[:2]
+    scale = min(1.0, float(max_size) / max(height, width))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    path = thumbnail_path(capture_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not cv2.imwrite(path, frame, [int(cv2.IMWRITE_JPEG_QUALITY), THUMBNAIL_JPEG_QUALITY]):
+        raise IOError(f"Falha ao gravar a miniatura {path}")
+    return path
+
+
+def ensure_thumbnail(capture_path, max_size=THUMBNAIL_SIZE):
+    """Retorna o caminho da miniatura, gerando-a a partir da captura se ainda não existir."""
+    path = thumbnail_path(capture_path)
+    if os.path.exists(path):
+        return path
+    # IMREAD_REDUCED_COLOR_2 já decodifica em metade da resolução, mais rápido que a imagem inteira
+    frame = cv2.imread(capture_path, cv2.IMREAD_REDUCED_COLOR_2)
+    if frame is None:
+        logging.warning(f"Não foi possível gerar a miniatura de {capture_path}.")
+        return None
+    return write_thumbnail(frame, capture_path, max_size)
+
+
+def delete_thumbnail(capture_path):
+    path = thumbnail_path(capture_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,138 @@
+# worker_pool.py
+"""Pool fixo de processos worker (`processing_mode: "pool"`), dimensionado pelos núcleos físicos.
+
+Cada worker fica preso a uma fatia de núcleos físicos e divide as threads intra-op do
+PyTorch só entre os grupos que ele executa, então a soma das threads nunca passa do número
+de núcleos. Um grupo volta de preferência ao worker onde o modelo dele já está carregado;
+quando todos os workers estão na capacidade, novos grupos são recusados (PoolFullError).
+"""
+
+import os
+import time
+import logging
+import threading
+
+from group_worker import HEARTBEAT_TIMEOUT, read_status, remove_ring, send_command, spawn_worker_host, status_alive
+
+
+class PoolFullError(RuntimeError):
+    pass
+
+
+def physical_core_sets():
+    """Listas de CPUs lógicas (irmãs de hyper-threading) por núcleo físico, dentro da afinidade do processo."""
+    if hasattr(os, 'sched_getaffinity'):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(os.cpu_count() or 1))
+    cores = {}
+    for cpu in allowed:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                key = f.read().strip()
+        except OSError:
+            key = str(cpu)  # Sem topologia (Windows/macOS): cada CPU conta como um núcleo
+        cores.setdefault(key, []).append(cpu)
+    return list(cores.values())
+
+
+class WorkerPool:
+    """Distribui os grupos entre `size` processos worker, cada um com até `capacity` grupos.
+
+    Os workers são criados sob demanda e continuam vivos depois que seus grupos param, para
+    manter os modelos em cache. O status de cada worker (grupos, modelos residentes, threads)
+    fica em um anel de memória compartilhada próprio, visível a qualquer processo web.
+    """
+
+    def __init__(self, config_factory, authkey, size=None, cores_per_worker=1, capacity=2):
+        self.config_factory = config_factory
+        self.authkey = authkey
+        self.capacity = max(1, int(capacity))
+        cores = physical_core_sets()
+        cores_per_worker = max(1, int(cores_per_worker))
+        self.size = max(1, int(size) if size else len(cores) // cores_per_worker)
+        # Fatias de núcleos por worker; com mais workers que núcleos, as fatias se repetem
+        self.core_slices = [
+            [cores[(i * cores_per_worker + j) % len(cores)] for j in range(cores_per_worker)]
+            for i in range(self.size)
+        ]
+        self.processes = {}
+        self.lock = threading.Lock()
+        logging.info(f"Pool de workers: {self.size} worker(s), {cores_per_worker} núcleo(s) físico(s) "
+                     f"e até {self.capacity} grupo(s) cada ({len(cores)} núcleo(s) disponível(is)).")
+
+    @staticmethod
+    def host_ring(index):
+        return f"nxt_pool_{index}"
+
+    def worker_status(self, index):
+        status = read_status(self.host_ring(index))
+        return status if status_alive(status) else {}
+
+    def stats(self):
+        return [dict(self.worker_status(i), index=i, cpus=sum(self.core_slices[i], [])) for i in range(self.size)]
+
+    def _spawn(self, index):
+        process = self.processes.get(index)
+        if process is not None and process.is_alive():
+            return process
+        core_slice = self.core_slices[index]
+        config = dict(self.config_factory(None), name=f"pool_{index}", authkey=self.authkey,
+                      capacity=self.capacity, host_ring=self.host_ring(index),
+                      cpus=sorted(set(sum(core_slice, []))), physical_cores=len(core_slice))
+        self.processes[index] = process = spawn_worker_host(config)
+        logging.info(f"Worker {index} do pool iniciado no processo {process.pid} (CPUs {config['cpus']}).")
+        return process
+
+    def _wait_ready(self, index, process):
+        deadline = time.time() + HEARTBEAT_TIMEOUT * 6
+        while time.time() < deadline and process.is_alive():
+            status = self.worker_status(index)
+            if status:
+                return status
+            time.sleep(0.05)
+        return {}
+
+    def launch(self, group_name):
+        """Inicia o grupo no worker mais adequado; retorna uma função que diz se ele segue vivo."""
+        with self.lock:
+            statuses = [self.worker_status(i) for i in range(self.size)]
+            # Primeiro o worker com o modelo do grupo em cache, depois o menos ocupado
+            order = sorted(range(self.size), key=lambda i: (
+                group_name not in statuses[i].get('resident', []),
+                len(statuses[i].get('groups', [])),
+                i
+            ))
+            config = self.config_factory(group_name)
+            for index in order:
+                if len(statuses[index].get('groups', [])) >= self.capacity:
+                    continue
+                status = statuses[index]
+                if not status:
+                    process = self._spawn(index)
+                    status = self._wait_ready(index, process)
+                    if not status:
+                        logging.error(f"Worker {index} do pool não iniciou.")
+                        continue
+                ok, message = send_command(status['address'], self.authkey, 'start', group_name, config)
+                if ok:
+                    logging.info(f"Grupo {group_name} atribuído ao worker {index} do pool.")
+                    return lambda: status_alive(self.worker_status(index))
+                if message != 'full':
+                    raise RuntimeError(message)
+        raise PoolFullError(f"Todos os {self.size} workers do pool estão ocupados "
+                            f"({self.capacity} grupo(s) cada). Pare outro grupo e tente novamente.")
+
+    def join(self, group_name):
+        pass  # Os workers do pool continuam vivos com os modelos em cache
+
+    def shutdown(self):
+        for index in range(self.size):
+            status = self.worker_status(index)
+            if status:
+                send_command(status['address'], self.authkey, 'shutdown', None)
+        for process in self.processes.values():
+            process.join(timeout=10)
+        # Um worker encerrado à força (ou que não respondeu) não remove o próprio anel
+        for index in range(self.size):
+            remove_ring(self.host_ring(index))